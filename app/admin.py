@@ -1,20 +1,111 @@
+import logging
+from functools import lru_cache
+from itertools import islice
+
+from celery import group
+from celery.utils import uuid
 from django.contrib import admin
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
 
 from app.models import (
-    DICOMFile, RuleGroup, Ruleset, Rule, PrescriptionTemplate, 
+    DICOMFile, ProcessingStatus, RuleGroup, Ruleset, Rule, PrescriptionTemplate, 
     Prescription, Patient, DICOMStudy, DICOMSeries, DICOMInstance,
     ImageInformation, RTStructureSetInformation, RTStructureROI
 )
-from app.tasks import process_dicom_file_task
+from app.tasks import discard_pending_tasks, process_dicom_file_task, record_pending_tasks
+
+logger = logging.getLogger(__name__)
+
+
+# Number of tasks published per Celery group by the bulk processing action
+DISPATCH_BATCH_SIZE = 500
+
+# Constant status markup shown in the DICOMFile changelist, keyed by processing_status
+_STATUS_HTML = {
+    'in_progress': mark_safe('<span style="color: orange;">Processing...</span>'),
+    'completed': mark_safe('<span style="color: green;">✓ Completed</span>'),
+    'failed': mark_safe('<span style="color: red;">✗ Failed</span>'),
+}
+
+
+@lru_cache(maxsize=None)
+def _process_url_parts():
+    """
+    Resolve the process-file URL once and split it around the file id.
+
+    Returns:
+        tuple: (prefix, suffix) such that prefix + str(id) + suffix is the URL
+    """
+    prefix, _, suffix = reverse('process_dicom_file', args=[0]).rpartition('0')
+    return prefix, suffix
+
+
+@receiver(setting_changed)
+def _reset_process_url_parts(setting, **kwargs):
+    """Drop the cached process-file URL when the URLconf is swapped (e.g. override_settings)."""
+    if setting == 'ROOT_URLCONF':
+        _process_url_parts.cache_clear()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large DICOM tables that avoids COUNT(*) on unfiltered changelists.
+
+    When the changelist is not filtered, the row count is taken from the PostgreSQL
+    planner statistics (pg_class.reltuples). Filtered lists, and tables whose estimate
+    is small or missing, fall back to an exact count.
+    """
+    # Below this many estimated rows an exact COUNT(*) is cheap enough
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class ChangelistOnlyMixin:
+    """
+    Restrict changelist queries to the columns the list actually renders.
+
+    Admins set list_display_db_fields to the model fields used by list_display
+    (including relations named in list_select_related). The change form still
+    loads full rows.
+    """
+    list_display_db_fields = None
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        opts = self.model._meta
+        changelist_url_name = f"{opts.app_label}_{opts.model_name}_changelist"
+        if self.list_display_db_fields and request.resolver_match and request.resolver_match.url_name == changelist_url_name:
+            queryset = queryset.only(*self.list_display_db_fields)
+        return queryset
 
 
 @admin.register(DICOMFile)
-class DICOMFileAdmin(admin.ModelAdmin):
+class DICOMFileAdmin(ChangelistOnlyMixin, admin.ModelAdmin):
     list_display = ['id', 'file', 'uploaded_by', 'processing_status', 'created_at', 'processing_actions']
+    list_select_related = ['uploaded_by']
+    list_display_db_fields = ['file', 'uploaded_by', 'processing_status', 'created_at']
     list_filter = ['processing_status', 'created_at']
     search_fields = ['file', 'uploaded_by__username']
     readonly_fields = ['processing_status', 'date_processing_completed', 'processing_log_data', 'created_at', 'updated_at']
@@ -22,36 +113,62 @@ class DICOMFileAdmin(admin.ModelAdmin):
     
     def processing_actions(self, obj):
         """Display action buttons for processing"""
+        html = _STATUS_HTML.get(obj.processing_status)
+        if html:
+            return html
         if obj.processing_status == 'pending':
-            process_url = reverse('admin:process_dicom_file', args=[obj.id])
+            prefix, suffix = _process_url_parts()
             return format_html(
                 '<a class="button" href="{}">Process Now</a>',
-                process_url
+                f"{prefix}{obj.id}{suffix}"
             )
-        elif obj.processing_status == 'in_progress':
-            return format_html('<span style="color: orange;">Processing...</span>')
-        elif obj.processing_status == 'completed':
-            return format_html('<span style="color: green;">✓ Completed</span>')
-        elif obj.processing_status == 'failed':
-            return format_html('<span style="color: red;">✗ Failed</span>')
         return '-'
     
     processing_actions.short_description = 'Actions'
     
     def process_selected_files(self, request, queryset):
         """Admin action to process selected DICOM files"""
-        # Filter only pending files
-        pending_files = queryset.filter(processing_status='pending')
-        
-        if not pending_files.exists():
-            self.message_user(request, "No pending files selected.", messages.WARNING)
-            return
+        # Stream the pending IDs from a server-side cursor instead of loading the selection
+        pending_ids = queryset.filter(processing_status='pending').values_list('id', flat=True).iterator(chunk_size=DISPATCH_BATCH_SIZE)
         
-        # Start processing tasks
+        # Start processing tasks in bounded groups, publishing every message
+        # through one pooled producer (one broker connection and channel)
         task_ids = []
-        for dicom_file in pending_files:
-            task = process_dicom_file_task.delay(dicom_file.id)
-            task_ids.append(task.id)
+        dispatch_failed = False
+        with process_dicom_file_task.app.producer_pool.acquire(block=True) as producer:
+            while batch := list(islice(pending_ids, DISPATCH_BATCH_SIZE)):
+                # Mark the whole batch as in progress with a single UPDATE before dispatching
+                DICOMFile.objects.filter(id__in=batch).update(
+                    processing_status=ProcessingStatus.IN_PROGRESS,
+                    updated_at=timezone.now()
+                )
+                
+                # Task IDs are generated here so the group result never has to be read back
+                batch_task_ids = [uuid() for _ in batch]
+                record_pending_tasks(batch_task_ids)
+                try:
+                    group(
+                        process_dicom_file_task.s(dicom_file_id).set(task_id=task_id)
+                        for dicom_file_id, task_id in zip(batch, batch_task_ids)
+                    ).apply_async(producer=producer)
+                except Exception as e:
+                    # Drop the batch's pending results so tasks that were never published do not
+                    # show as queued forever, and hand the files back so they can be processed again
+                    logger.error(f"Error dispatching DICOM processing tasks: {str(e)}")
+                    discard_pending_tasks(batch_task_ids)
+                    DICOMFile.objects.filter(id__in=batch).update(
+                        processing_status=ProcessingStatus.PENDING,
+                        updated_at=timezone.now()
+                    )
+                    self.message_user(request, f"Could not queue {len(batch)} file(s) for processing: {str(e)}", messages.ERROR)
+                    dispatch_failed = True
+                    break
+                task_ids.extend(batch_task_ids)
+        
+        if not task_ids:
+            if not dispatch_failed:
+                self.message_user(request, "No pending files selected.", messages.WARNING)
+            return
         
         # Redirect to progress page with task IDs
         task_ids_str = ','.join(task_ids)
@@ -69,6 +186,7 @@ class RuleGroupAdmin(admin.ModelAdmin):
 @admin.register(Ruleset)
 class RulesetAdmin(admin.ModelAdmin):
     list_display = ['id', 'ruleset_name', 'rulegroup', 'ruleset_order', 'ruleset_combination', 'created_at']
+    list_select_related = ['rulegroup']
     list_filter = ['rulegroup']
     search_fields = ['ruleset_name']
     ordering = ['rulegroup', 'ruleset_order']
@@ -77,6 +195,7 @@ class RulesetAdmin(admin.ModelAdmin):
 @admin.register(Rule)
 class RuleAdmin(admin.ModelAdmin):
     list_display = ['id', 'ruleset', 'rule_order', 'parameter_to_be_matched', 'matching_operator', 'matching_value']
+    list_select_related = ['ruleset']
     list_filter = ['ruleset__rulegroup', 'parameter_to_be_matched', 'matching_operator']
     search_fields = ['matching_value']
     ordering = ['ruleset', 'rule_order']
@@ -85,6 +204,7 @@ class RuleAdmin(admin.ModelAdmin):
 @admin.register(PrescriptionTemplate)
 class PrescriptionTemplateAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'cancer_site', 'cancer_side', 'treatment_modality', 'rulegroup_name']
+    list_select_related = ['rulegroup_name']
     list_filter = ['cancer_side', 'treatment_modality']
     search_fields = ['name', 'cancer_site']
 
@@ -92,6 +212,7 @@ class PrescriptionTemplateAdmin(admin.ModelAdmin):
 @admin.register(Prescription)
 class PrescriptionAdmin(admin.ModelAdmin):
     list_display = ['id', 'prescription_template', 'roi_name', 'dose_prescribed', 'dose_unit', 'fractions_prescribed']
+    list_select_related = ['prescription_template']
     list_filter = ['prescription_template', 'dose_unit']
     search_fields = ['roi_name']
 
@@ -99,7 +220,7 @@ class PrescriptionAdmin(admin.ModelAdmin):
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
     list_display = ['id', 'unique_patient_id', 'patient_name', 'patient_dob', 'patient_sex', 'created_at']
-    search_fields = ['unique_patient_id', 'patient_name']
+    search_fields = ['unique_patient_id', 'patient_name', 'display_name']
     list_filter = ['patient_sex']
     readonly_fields = ['created_at', 'updated_at']
 
@@ -107,6 +228,7 @@ class PatientAdmin(admin.ModelAdmin):
 @admin.register(DICOMStudy)
 class DICOMStudyAdmin(admin.ModelAdmin):
     list_display = ['id', 'study_instance_uid', 'patient', 'study_description', 'study_date', 'created_at']
+    list_select_related = ['patient']
     search_fields = ['study_instance_uid', 'study_description']
     list_filter = ['study_date']
     readonly_fields = ['created_at', 'updated_at']
@@ -115,37 +237,50 @@ class DICOMStudyAdmin(admin.ModelAdmin):
 @admin.register(DICOMSeries)
 class DICOMSeriesAdmin(admin.ModelAdmin):
     list_display = ['id', 'series_instance_uid', 'dicom_study', 'series_description', 'series_date', 'created_at']
-    search_fields = ['series_instance_uid', 'series_description']
+    list_select_related = ['dicom_study']
+    search_fields = ['series_instance_uid', 'series_description', 'display_name']
     list_filter = ['series_date']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(DICOMInstance)
-class DICOMInstanceAdmin(admin.ModelAdmin):
+class DICOMInstanceAdmin(ChangelistOnlyMixin, admin.ModelAdmin):
     list_display = ['id', 'sop_instance_uid', 'dicom_series', 'modality', 'created_at']
+    list_select_related = ['dicom_series']
+    list_display_db_fields = ['sop_instance_uid', 'dicom_series', 'modality', 'created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ['sop_instance_uid']
     list_filter = ['modality']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(ImageInformation)
-class ImageInformationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'dicom_instance', 'slice_location', 'slice_thickness', 'instance_number']
+class ImageInformationAdmin(ChangelistOnlyMixin, admin.ModelAdmin):
+    list_display = ['dicom_instance', 'slice_location', 'slice_thickness', 'instance_number']
+    list_select_related = ['dicom_instance']
+    list_display_db_fields = ['dicom_instance', 'slice_location', 'slice_thickness', 'instance_number']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ['dicom_instance__sop_instance_uid']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(RTStructureSetInformation)
-class RTStructureSetInformationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'dicom_instance', 'number_of_roi', 'prescription_template_id', 'created_at']
+class RTStructureSetInformationAdmin(ChangelistOnlyMixin, admin.ModelAdmin):
+    list_display = ['dicom_instance', 'number_of_roi', 'prescription_template', 'created_at']
+    list_select_related = ['dicom_instance', 'prescription_template']
+    list_display_db_fields = ['dicom_instance', 'number_of_roi', 'prescription_template', 'created_at']
     search_fields = ['dicom_instance__sop_instance_uid']
-    list_filter = ['prescription_template_id']
+    list_filter = ['prescription_template']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(RTStructureROI)
-class RTStructureROIAdmin(admin.ModelAdmin):
+class RTStructureROIAdmin(ChangelistOnlyMixin, admin.ModelAdmin):
     list_display = ['id', 'rt_structure_set', 'roi_number', 'roi_name', 'created_at']
+    list_select_related = ['rt_structure_set']
+    list_display_db_fields = ['rt_structure_set', 'roi_number', 'roi_name', 'created_at']
     search_fields = ['roi_name']
     list_filter = ['rt_structure_set']
     readonly_fields = ['created_at', 'updated_at']
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:22
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicominstance',
+            name='modality',
+            field=models.CharField(blank=True, db_index=True, help_text='Modality tag data extracted from the DICOM data', max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dicomseries',
+            name='series_date',
+            field=models.DateField(blank=True, db_index=True, help_text='Series Date tag data extracted from the DICOM data', null=True),
+        ),
+        migrations.AlterField(
+            model_name='dicomstudy',
+            name='study_date',
+            field=models.DateField(blank=True, db_index=True, help_text='Study Date tag data extracted from the DICOM data', null=True),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='patient_sex',
+            field=models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other')], db_index=True, help_text='Patient Sex extracted from DICOM data. This is then matched to the Gender choices', max_length=10, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='dicomfile',
+            index=models.Index(fields=['processing_status', '-created_at'], name='dicomfile_status_created_idx'),
+        ),
+    ]
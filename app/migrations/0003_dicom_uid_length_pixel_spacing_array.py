@@ -0,0 +1,62 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:23
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        # Existing values are str(MultiValue) such as "[0.9765625, 0.9765625]";
+        # Django cannot cast varchar to a float array on its own, so convert in SQL.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE app_dicominstance
+                        ALTER COLUMN pixel_spacing TYPE double precision[]
+                        USING CASE
+                            WHEN regexp_replace(pixel_spacing, '[\\[\\]''" ]', '', 'g') = '' THEN NULL
+                            ELSE string_to_array(regexp_replace(pixel_spacing, '[\\[\\]''" ]', '', 'g'), ',')::double precision[]
+                        END
+                    """,
+                    reverse_sql="""
+                        ALTER TABLE app_dicominstance
+                        ALTER COLUMN pixel_spacing TYPE varchar(255)
+                        USING '[' || array_to_string(pixel_spacing, ', ') || ']'
+                    """,
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='dicominstance',
+                    name='pixel_spacing',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, help_text='Pixel Spacing tag data extracted from the DICOM data as [row spacing, column spacing] in mm', null=True, size=2),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='dicominstance',
+            name='sop_instance_uid',
+            field=models.CharField(help_text='DICOM SOP Instance UID extracted from the DICOM data.', max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='dicomseries',
+            name='series_instance_uid',
+            field=models.CharField(help_text='DICOM Series Instance UID extracted from the DICOM data.', max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='dicomstudy',
+            name='study_instance_uid',
+            field=models.CharField(help_text='DICOM Study Instance UID extracted from the DICOM data.', max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='unique_patient_id',
+            field=models.CharField(help_text='Unique Patient ID extracted from DICOM data', max_length=64, unique=True),
+        ),
+    ]
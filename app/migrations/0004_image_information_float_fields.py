@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_dicom_uid_length_pixel_spacing_array'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageinformation',
+            name='slice_location',
+            field=models.FloatField(blank=True, help_text='The Slice Location value extracted from the DICOM data', null=True),
+        ),
+        migrations.AlterField(
+            model_name='imageinformation',
+            name='slice_thickness',
+            field=models.FloatField(blank=True, help_text='Slice thickness values obtained from the DICOM file', null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:25
+
+import numpy as np
+from django.db import migrations, models
+
+
+def pack_contour_json(apps, schema_editor):
+    RTStructureROI = apps.get_model('app', 'RTStructureROI')
+    for roi in RTStructureROI.objects.only('id', 'roi_contour_data').iterator(chunk_size=100):
+        offsets = []
+        arrays = []
+        start = 0
+        for contour in roi.roi_contour_data or []:
+            points = np.asarray(contour.get('contour_data', []), dtype='<f4').reshape(-1, 3)
+            offsets.append([contour.get('referenced_sop_instance_uid', ''), start, len(points)])
+            arrays.append(points)
+            start += len(points)
+        roi.roi_contour_points = np.concatenate(arrays).tobytes() if arrays else b''
+        roi.roi_contour_offsets = offsets
+        roi.save(update_fields=['roi_contour_points', 'roi_contour_offsets'])
+
+
+def unpack_contour_json(apps, schema_editor):
+    RTStructureROI = apps.get_model('app', 'RTStructureROI')
+    for roi in RTStructureROI.objects.only('id', 'roi_contour_points', 'roi_contour_offsets').iterator(chunk_size=100):
+        points = np.frombuffer(roi.roi_contour_points, dtype='<f4').reshape(-1, 3)
+        roi.roi_contour_data = [
+            {
+                'contour_data': points[start:start + count].ravel().tolist(),
+                'referenced_sop_instance_uid': referenced_sop_uid,
+            }
+            for referenced_sop_uid, start, count in roi.roi_contour_offsets
+        ]
+        roi.save(update_fields=['roi_contour_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_image_information_float_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rtstructureroi',
+            name='roi_contour_offsets',
+            field=models.JSONField(default=list, help_text='One [Referenced SOP Instance UID, first point index, number of points] entry per contour, locating each contour inside the packed contour points.'),
+        ),
+        migrations.AddField(
+            model_name='rtstructureroi',
+            name='roi_contour_points',
+            field=models.BinaryField(default=b'', help_text='ROI Contour Data tag data extracted from the RTStructureSet data for all contours of the ROI, packed as little-endian float32 (x, y, z) triplets.'),
+        ),
+        migrations.AlterField(
+            model_name='rtstructureroi',
+            name='roi_contour_data',
+            field=models.JSONField(null=True, help_text='ROI Contour Data tag data extracted from the RTStructureSet data along with corresponding Referenced SOP Instance UID values for each Referenced SOP Instance UID. This will be stored as a tuple.'),
+        ),
+        migrations.RunPython(pack_contour_json, unpack_contour_json),
+        migrations.RemoveField(
+            model_name='rtstructureroi',
+            name='roi_contour_data',
+        ),
+    ]
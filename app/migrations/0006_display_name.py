@@ -0,0 +1,36 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_rtstructureroi_packed_contours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Patient name and ID used for display and search. This is set automatically on save.', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='dicomseries',
+            name='display_name',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Series description and UID used for display and search. This is set automatically on save.', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE app_patient SET display_name = left(
+                    CASE WHEN coalesce(patient_name, '') = '' THEN unique_patient_id
+                    ELSE patient_name || ' (' || unique_patient_id || ')' END, 255);
+                UPDATE app_dicomseries SET display_name = left(
+                    CASE WHEN coalesce(series_description, '') = '' THEN series_instance_uid
+                    ELSE series_description || ' (' || series_instance_uid || ')' END, 255);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
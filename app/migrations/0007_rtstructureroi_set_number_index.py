@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0006_display_name'),
+    ]
+
+    operations = [
+        # The (rt_structure_set, roi_number) index is built concurrently as a unique index and then
+        # attached to the unique constraint, which also serves the lookups by structure set and ROI number
+        migrations.RunSQL(
+            sql=[
+                'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "unique_rt_structure_set_roi_number" '
+                'ON "app_rtstructureroi" ("rt_structure_set_id", "roi_number")',
+                'ALTER TABLE "app_rtstructureroi" ADD CONSTRAINT "unique_rt_structure_set_roi_number" '
+                'UNIQUE USING INDEX "unique_rt_structure_set_roi_number"',
+            ],
+            reverse_sql='ALTER TABLE "app_rtstructureroi" DROP CONSTRAINT "unique_rt_structure_set_roi_number"',
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='rtstructureroi',
+                    constraint=models.UniqueConstraint(fields=('rt_structure_set', 'roi_number'), name='unique_rt_structure_set_roi_number'),
+                ),
+            ],
+        ),
+    ]
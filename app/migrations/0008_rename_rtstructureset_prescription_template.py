@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_rtstructureroi_set_number_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='rtstructuresetinformation',
+            old_name='prescription_template_id',
+            new_name='prescription_template',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:35
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0008_rename_rtstructureset_prescription_template'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dicominstance',
+            index=models.Index(fields=['dicom_series', 'modality'], name='dicominstance_series_mod_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dicomseries',
+            index=models.Index(fields=['dicom_study', 'frame_of_reference_uid'], name='dicomseries_study_frame_idx'),
+        ),
+        # The composite indexes above lead with the FK columns, so drop Django's single-column FK indexes.
+        # Done in SQL so the indexes are dropped concurrently and the FK constraints are not re-validated.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "app_dicominstance_dicom_series_id_b028f2a3"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY "app_dicominstance_dicom_series_id_b028f2a3" ON "app_dicominstance" ("dicom_series_id")',
+                ),
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "app_dicomseries_dicom_study_id_30569086"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY "app_dicomseries_dicom_study_id_30569086" ON "app_dicomseries" ("dicom_study_id")',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='dicominstance',
+                    name='dicom_series',
+                    field=models.ForeignKey(db_index=False, help_text='DICOM Series ID to which the DICOM instance refers to.', on_delete=django.db.models.deletion.CASCADE, to='app.dicomseries'),
+                ),
+                migrations.AlterField(
+                    model_name='dicomseries',
+                    name='dicom_study',
+                    field=models.ForeignKey(db_index=False, help_text='DICOM Study ID to which the DICOM series refers to.', on_delete=django.db.models.deletion.CASCADE, to='app.dicomstudy'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_dicom_hierarchy_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicomfile',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', help_text='Processing status of the DICOM file.', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='prescriptiontemplate',
+            name='cancer_side',
+            field=models.CharField(blank=True, choices=[('left', 'Left'), ('right', 'Right'), ('midline', 'Midline'), ('bilateral', 'Bilateral'), ('not_applicable', 'Not Applicable')], help_text='Side of the disease. Select from the list.', max_length=16, null=True),
+        ),
+        migrations.AlterField(
+            model_name='prescriptiontemplate',
+            name='treatment_modality',
+            field=models.CharField(blank=True, choices=[('EBRT', 'External Beam Radiotherapy'), ('Electron', 'Electron'), ('Proton', 'Proton'), ('Carbon', 'Carbon Ion'), ('Brachytherapy', 'Brachytherapy')], help_text='Treatment modality. Select from the list.', max_length=16, null=True),
+        ),
+        migrations.AlterField(
+            model_name='rule',
+            name='matching_operator',
+            field=models.CharField(blank=True, choices=[('equals', 'Equals'), ('not_equals', 'Not Equals'), ('string_contains_case_insensitive', 'String Contains Case Insensitive'), ('string_contains_case_sensitive', 'String Contains Case Sensitive'), ('string_does_not_contain_case_insensitive', 'String Does Not Contain Case Insensitive'), ('string_does_not_contain_case_sensitive', 'String Does Not Contain Case Sensitive'), ('greater_than', 'Greater Than'), ('greater_than_or_equal_to', 'Greater Than Or Equal To'), ('less_than', 'Less Than'), ('less_than_or_equal_to', 'Less Than Or Equal To')], help_text='Matching operator to be used. Select from the list or provide your own', max_length=48, null=True),
+        ),
+        migrations.AlterField(
+            model_name='rule',
+            name='parameter_to_be_matched',
+            field=models.CharField(blank=True, choices=[('roi_name', 'ROI Name'), ('modality', 'Modality'), ('structure_set_label', 'Structure Set Label'), ('study_description', 'Study Description'), ('series_description', 'Series Description'), ('patients_sex', "Patient's Sex"), ('approval_status', 'Approval Status')], help_text='Parameter to be matched. Select from the list or provide your own', max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='rule',
+            name='rule_combination_type',
+            field=models.CharField(blank=True, choices=[('and', 'And'), ('or', 'Or')], help_text='How should the rule be combined with other rules in the ruleset.', max_length=16, null=True),
+        ),
+    ]
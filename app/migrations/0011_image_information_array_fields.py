@@ -0,0 +1,57 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:36
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_shrink_choice_columns'),
+    ]
+
+    operations = [
+        # Convert the JSON lists in SQL: the jsonb text '[1.0, 2.0]' becomes the array literal '{1.0, 2.0}'.
+        # Anything that is not a JSON array (including JSON null) becomes NULL.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE app_imageinformation
+                        ALTER COLUMN pixel_spacing TYPE double precision[] USING CASE
+                            WHEN jsonb_typeof(pixel_spacing) = 'array' THEN translate(pixel_spacing::text, '[]"', '{}')::double precision[]
+                        END,
+                        ALTER COLUMN image_position_patient TYPE double precision[] USING CASE
+                            WHEN jsonb_typeof(image_position_patient) = 'array' THEN translate(image_position_patient::text, '[]"', '{}')::double precision[]
+                        END,
+                        ALTER COLUMN image_orientation_patient TYPE double precision[] USING CASE
+                            WHEN jsonb_typeof(image_orientation_patient) = 'array' THEN translate(image_orientation_patient::text, '[]"', '{}')::double precision[]
+                        END
+                    """,
+                    reverse_sql="""
+                        ALTER TABLE app_imageinformation
+                        ALTER COLUMN pixel_spacing TYPE jsonb USING to_jsonb(pixel_spacing),
+                        ALTER COLUMN image_position_patient TYPE jsonb USING to_jsonb(image_position_patient),
+                        ALTER COLUMN image_orientation_patient TYPE jsonb USING to_jsonb(image_orientation_patient)
+                    """,
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='imageinformation',
+                    name='image_orientation_patient',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, help_text='Image Orientation (Patient) tag data extracted from the DICOM data. It specifies the direction cosines of the first row and the first column with respect to the patient. These Attributes shall be provide as a pair. Row value for the x, y, and z axes respectively followed by the Column value for the x, y, and z axes respectively.', null=True, size=6),
+                ),
+                migrations.AlterField(
+                    model_name='imageinformation',
+                    name='image_position_patient',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, help_text='Image Position (Patient) tag data extracted from the DICOM data. It refers to the x, y, and z coordinates of the upper left hand corner of the image; it is the center of the first voxel transmitted', null=True, size=3),
+                ),
+                migrations.AlterField(
+                    model_name='imageinformation',
+                    name='pixel_spacing',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, help_text='Pixel spacing value obtained from the DICOM file. The two values represent the distance between the center of the pixels in the row and column respectively.', null=True, size=2),
+                ),
+            ],
+        ),
+    ]
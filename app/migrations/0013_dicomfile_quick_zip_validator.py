@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:39
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_image_information_array_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicomfile',
+            name='file',
+            field=models.FileField(help_text='Upload the DICOM file here.', upload_to='dicom_files', validators=[app.models.validate_zip_file_quick]),
+        ),
+    ]
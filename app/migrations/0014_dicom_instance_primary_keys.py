@@ -0,0 +1,66 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_dicomfile_quick_zip_validator'),
+    ]
+
+    operations = [
+        # RTStructureROI rows reference RTStructureSetInformation by its old id. Drop that foreign key
+        # (its deferred checks would block the ALTER TABLEs below) and point the rows at dicom_instance_id.
+        # The unique (rt_structure_set, roi_number) index is checked row by row and old ids can equal other
+        # sets' new ids, so rows are moved to the negated target first and then flipped back in a second pass
+        migrations.RunSQL(
+            sql="""
+                DO $$
+                DECLARE fk_name text;
+                BEGIN
+                    SELECT conname INTO fk_name FROM pg_constraint
+                    WHERE conrelid = 'app_rtstructureroi'::regclass AND contype = 'f'
+                        AND confrelid = 'app_rtstructuresetinformation'::regclass;
+                    EXECUTE format('ALTER TABLE app_rtstructureroi DROP CONSTRAINT %I', fk_name);
+                END $$;
+                UPDATE app_rtstructureroi AS roi SET rt_structure_set_id = -rs.dicom_instance_id
+                FROM app_rtstructuresetinformation AS rs WHERE roi.rt_structure_set_id = rs.id;
+                UPDATE app_rtstructureroi SET rt_structure_set_id = -rt_structure_set_id WHERE rt_structure_set_id < 0;
+            """,
+            reverse_sql="""
+                UPDATE app_rtstructureroi AS roi SET rt_structure_set_id = -rs.id
+                FROM app_rtstructuresetinformation AS rs WHERE roi.rt_structure_set_id = rs.dicom_instance_id;
+                UPDATE app_rtstructureroi SET rt_structure_set_id = -rt_structure_set_id WHERE rt_structure_set_id < 0;
+                ALTER TABLE app_rtstructureroi ADD CONSTRAINT app_rtstructureroi_rt_structure_set_id_fk
+                    FOREIGN KEY (rt_structure_set_id) REFERENCES app_rtstructuresetinformation (id) DEFERRABLE INITIALLY DEFERRED;
+            """,
+        ),
+        migrations.RemoveField(
+            model_name='imageinformation',
+            name='id',
+        ),
+        migrations.RemoveField(
+            model_name='rtstructuresetinformation',
+            name='id',
+        ),
+        migrations.AlterField(
+            model_name='imageinformation',
+            name='dicom_instance',
+            field=models.OneToOneField(help_text='The DICOM Instance ID of the image referenced. This is also the primary key.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='app.dicominstance'),
+        ),
+        migrations.AlterField(
+            model_name='rtstructuresetinformation',
+            name='dicom_instance',
+            field=models.OneToOneField(help_text='DICOM Instance ID for the ROI obtained from the RTStructureSet data. This is also the primary key.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='app.dicominstance'),
+        ),
+        # Recreate the RTStructureROI foreign key against the new primary key
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE app_rtstructureroi ADD CONSTRAINT app_rtstructureroi_rt_structure_set_id_fk
+                    FOREIGN KEY (rt_structure_set_id) REFERENCES app_rtstructuresetinformation (dicom_instance_id) DEFERRABLE INITIALLY DEFERRED;
+            """,
+            reverse_sql="ALTER TABLE app_rtstructureroi DROP CONSTRAINT app_rtstructureroi_rt_structure_set_id_fk;",
+        ),
+    ]
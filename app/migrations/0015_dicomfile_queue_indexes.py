@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0014_dicom_instance_primary_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dicomfile',
+            index=models.Index(condition=models.Q(('processing_status__in', ['pending', 'in_progress'])), fields=['processing_status'], name='dicomfile_active_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dicomfile',
+            index=models.Index(fields=['uploaded_by', '-created_at'], name='dicomfile_uploader_created_idx'),
+        ),
+        # The uploader index above leads with the FK column, so drop Django's single-column FK index.
+        # Done in SQL so the index is dropped concurrently and the FK constraint is not re-validated.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "app_dicomfile_uploaded_by_id_ca118ff1"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY "app_dicomfile_uploaded_by_id_ca118ff1" ON "app_dicomfile" ("uploaded_by_id")',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='dicomfile',
+                    name='uploaded_by',
+                    field=models.ForeignKey(db_index=False, help_text='User who uploaded the DICOM file. Please upload a single ZIP file.', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
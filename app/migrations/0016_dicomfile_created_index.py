@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-15 23:13
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0015_dicomfile_queue_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dicomfile',
+            index=models.Index(fields=['-created_at'], name='dicomfile_created_idx'),
+        ),
+    ]
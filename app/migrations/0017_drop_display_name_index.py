@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-15 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_dicomfile_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicomseries',
+            name='display_name',
+            field=models.CharField(editable=False, help_text='Series description and UID used for display and search. This is set automatically on save.', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='display_name',
+            field=models.CharField(editable=False, help_text='Patient name and ID used for display and search. This is set automatically on save.', max_length=255),
+        ),
+    ]
@@ -1,10 +1,18 @@
 from email.policy import default
-from django.db import models
+from django.conf import settings
+from django.db import DataError, models
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
+from django.core.files import File
 import magic
+import mmap
+import numpy as np
 import zipfile
+import zlib
 import os
+import threading
 # Create your models here.
 
 ## File handling model
@@ -15,10 +23,84 @@ class ProcessingStatus(models.TextChoices):
     COMPLETED = 'completed', 'Completed'
     FAILED = 'failed', 'Failed'
 
-def validate_zip_file(file):
+# libmagic cookie shared by all uploads; loading the magic database is the expensive part of sniffing.
+# The cookie is not thread safe, so calls are serialized with a lock.
+_MAGIC = magic.Magic(mime=True)
+_MAGIC_LOCK = threading.Lock()
+
+# Number of leading bytes read for MIME type detection
+MIME_SNIFF_SIZE = 4096
+
+# MIME types accepted for ZIP uploads
+_VALID_ZIP_MIMES = frozenset({
+    'application/zip',
+    'application/x-zip-compressed',
+    'multipart/x-zip',
+})
+
+# Signatures a ZIP archive can start with: local file header and empty archive (EOCD).
+# Spanned archives (PK\x07\x08) are not accepted, since zipfile cannot open them.
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06')
+
+# The End Of Central Directory record is 22 bytes followed by an optional comment of up to 64 KiB,
+# so it is always found within this many bytes of the end of a ZIP archive
+ZIP_EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP_EOCD_MIN_SIZE = 22
+ZIP_EOCD_SEARCH_SIZE = ZIP_EOCD_MIN_SIZE + 65535
+
+# Read buffer used when a ZIP archive is opened straight from a path on disk
+ZIP_READ_BUFFER_SIZE = 128 * 1024
+
+# Read buffer used when a stored ZIP archive is opened for processing
+ZIP_PROCESSING_BUFFER_SIZE = 1024 * 1024
+
+def _has_zip_eocd(file):
     """
-    Validator function to ensure uploaded file is a valid ZIP file.
-    Performs both extension check and MIME type detection.
+    Check for the ZIP End Of Central Directory record by reading only the tail of the file.
+
+    Args:
+        file: Seekable file object
+
+    Returns:
+        bool: True if the EOCD signature is present near the end of the file
+    """
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(max(0, size - ZIP_EOCD_SEARCH_SIZE))
+    tail = file.read()
+    file.seek(0)
+    return tail.rfind(ZIP_EOCD_SIGNATURE) != -1
+
+def _find_eocd(path):
+    """
+    Find the ZIP End Of Central Directory record in a file on disk by memory mapping its tail,
+    so the search window is scanned without copying it into a bytes object.
+
+    Args:
+        path: Path of the file to search
+
+    Returns:
+        int: Offset of the EOCD signature from the start of the file, or -1 if it is not found
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+        if size < ZIP_EOCD_MIN_SIZE:
+            return -1
+        # The record starts between size - 22 and size - 22 - 0xffff; mmap offsets must be page aligned
+        start = max(0, size - ZIP_EOCD_SEARCH_SIZE)
+        map_offset = start - start % mmap.ALLOCATIONGRANULARITY
+        with mmap.mmap(fd, size - map_offset, offset=map_offset, access=mmap.ACCESS_READ) as tail:
+            found = tail.rfind(ZIP_EOCD_SIGNATURE, start - map_offset, size - map_offset - ZIP_EOCD_MIN_SIZE + len(ZIP_EOCD_SIGNATURE))
+        return found + map_offset if found != -1 else -1
+    finally:
+        os.close(fd)
+
+def validate_zip_file_quick(file):
+    """
+    Validator function run on upload to reject files that are obviously not ZIP files.
+    Performs extension and size checks, then ZIP signature and MIME type checks on the file header only.
+    The archive structure is checked by validate_zip_file_full, which the processing task runs before extraction.
     """
     # Check file extension
     file_extension = os.path.splitext(file.name)[1].lower()
@@ -27,45 +109,127 @@ def validate_zip_file(file):
             f'Invalid file extension "{file_extension}". Only .zip files are allowed.'
         )
     
-    # Check MIME type using python-magic
+    # Check the size before reading anything
+    if file.size is not None:
+        if file.size > settings.ICON_MAX_ZIP_SIZE:
+            raise ValidationError(
+                f'File exceeds maximum size of {settings.ICON_MAX_ZIP_SIZE} bytes.'
+            )
+        if file.size < ZIP_EOCD_MIN_SIZE:
+            raise ValidationError(
+                f'File is too small to be a valid ZIP file (minimum {ZIP_EOCD_MIN_SIZE} bytes).'
+            )
+    
+    # Read only the first chunk of the file; it is used for both the signature and MIME checks.
+    # chunks() rewinds the file before reading.
     try:
-        # Read the first chunk of the file for MIME type detection
-        file.seek(0)
-        file_mime = magic.from_buffer(file.read(2048), mime=True)
+        header = next(file.chunks(chunk_size=MIME_SNIFF_SIZE), b'')
         file.seek(0)  # Reset file pointer
+    except Exception as e:
+        raise ValidationError(f'Error reading uploaded file: {str(e)}')
+    
+    # Check the ZIP signature (local file header or empty archive)
+    if not header.startswith(ZIP_SIGNATURES):
+        raise ValidationError('Invalid file type. The file does not start with a ZIP signature.')
+    
+    # Check MIME type using python-magic
+    try:
+        with _MAGIC_LOCK:
+            file_mime = _MAGIC.from_buffer(header)
         
-        # Valid MIME types for ZIP files
-        valid_mime_types = [
-            'application/zip',
-            'application/x-zip-compressed',
-            'multipart/x-zip'
-        ]
-        
-        if file_mime not in valid_mime_types:
+        if file_mime not in _VALID_ZIP_MIMES:
             raise ValidationError(
                 f'Invalid file type. Detected MIME type: "{file_mime}". '
-                f'Expected a ZIP file with MIME type: {" or ".join(valid_mime_types)}.'
+                f'Expected a ZIP file with MIME type: {" or ".join(sorted(_VALID_ZIP_MIMES))}.'
             )
+    except ValidationError:
+        raise
     except Exception as e:
         raise ValidationError(f'Error detecting file type: {str(e)}')
-    
-    # Verify the file is a valid ZIP archive
-    try:
-        file.seek(0)
-        # Try to open as a ZIP file to verify integrity
-        zip_file = zipfile.ZipFile(file)
-        # Test the ZIP file for errors
-        bad_file = zip_file.testzip()
-        if bad_file:
+
+def check_zip_uncompressed_size(zip_file):
+    """
+    Reject archives that expand beyond the configured limits, using the sizes recorded in the central directory.
+    zipfile never returns more data for a member than its recorded size, so the recorded sizes bound
+    what later reads can decompress.
+
+    Args:
+        zip_file: Open zipfile.ZipFile
+
+    Raises:
+        ValidationError: If a member or the whole archive is larger than allowed once uncompressed
+    """
+    total_size = 0
+    for file_info in zip_file.infolist():
+        if file_info.file_size > settings.ICON_MAX_ZIP_MEMBER_SIZE:
             raise ValidationError(
-                f'Corrupted ZIP file. File "{bad_file}" failed integrity check.'
+                f'File "{file_info.filename}" in the ZIP archive is too large when uncompressed. '
+                f'Maximum size is {settings.ICON_MAX_ZIP_MEMBER_SIZE // (1024 * 1024)} MB.'
             )
-        zip_file.close()
-        file.seek(0)  # Reset file pointer
+        total_size += file_info.file_size
+    if total_size > settings.ICON_MAX_ZIP_UNCOMPRESSED_SIZE:
+        raise ValidationError(
+            f'ZIP archive is too large when uncompressed. '
+            f'Maximum size is {settings.ICON_MAX_ZIP_UNCOMPRESSED_SIZE // (1024 * 1024)} MB.'
+        )
+
+def open_zip_archive(file, check_eocd=True):
+    """
+    Check the ZIP archive structure and open it. Only the central directory at the end of the file is read.
+    Archives that would expand beyond the configured limits are rejected (see check_zip_uncompressed_size).
+
+    Args:
+        file: Seekable file object that has passed validate_zip_file_quick
+        check_eocd: Look for the End Of Central Directory record before parsing. Pass False if the caller has already done so.
+
+    Returns:
+        zipfile.ZipFile: The opened archive, which the caller is responsible for closing
+
+    Raises:
+        ValidationError: If the file is not a valid ZIP archive
+    """
+    try:
+        # Look for the End Of Central Directory record before parsing anything
+        if check_eocd and not _has_zip_eocd(file):
+            raise zipfile.BadZipFile
+        zip_file = zipfile.ZipFile(file)
     except zipfile.BadZipFile:
         raise ValidationError('Invalid or corrupted ZIP file.')
     except Exception as e:
         raise ValidationError(f'Error validating ZIP file: {str(e)}')
+    
+    try:
+        check_zip_uncompressed_size(zip_file)
+    except ValidationError:
+        zip_file.close()
+        raise
+    return zip_file
+
+def validate_zip_file_full(file):
+    """
+    Validator function to ensure a file is a valid ZIP file.
+    Runs the header checks of validate_zip_file_quick, then checks the archive structure
+    using only the central directory. Member CRCs are verified by DICOMFile.verify_integrity.
+    """
+    validate_zip_file_quick(file)
+    
+    # Uploads spooled to disk are checked through their temporary path with a large read buffer,
+    # leaving the Django file handle untouched
+    if hasattr(file, 'temporary_file_path'):
+        path = file.temporary_file_path()
+        if _find_eocd(path) == -1:
+            raise ValidationError('Invalid or corrupted ZIP file.')
+        with open(path, 'rb', buffering=ZIP_READ_BUFFER_SIZE) as fh:
+            with open_zip_archive(fh, check_eocd=False):
+                pass
+        return
+    
+    with open_zip_archive(file):
+        pass
+    file.seek(0)  # Reset file pointer
+
+# Kept for the historical migrations that reference it
+validate_zip_file = validate_zip_file_full
 
 class DICOMFile(models.Model):
     '''
@@ -74,10 +238,10 @@ class DICOMFile(models.Model):
     file = models.FileField(
         upload_to='dicom_files',
         help_text="Upload the DICOM file here.",
-        validators=[validate_zip_file]
+        validators=[validate_zip_file_quick]
     )
-    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE,help_text="User who uploaded the DICOM file. Please upload a single ZIP file.")
-    processing_status = models.CharField(max_length=255, default=ProcessingStatus.PENDING, choices=ProcessingStatus.choices,help_text="Processing status of the DICOM file.")
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE,db_index=False,help_text="User who uploaded the DICOM file. Please upload a single ZIP file.")
+    processing_status = models.CharField(max_length=16, default=ProcessingStatus.PENDING, choices=ProcessingStatus.choices,help_text="Processing status of the DICOM file.")
     date_processing_completed = models.DateTimeField(null=True, blank=True,help_text="Date and time when the processing is completed successfully.")
     processing_log_data = models.JSONField(null=True, blank=True,help_text="Processing log data stored after processing is completed.")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -85,10 +249,52 @@ class DICOMFile(models.Model):
 
     class Meta:
         verbose_name_plural = "DICOM Files"
+        indexes = [
+            models.Index(fields=['processing_status', '-created_at'], name='dicomfile_status_created_idx'),
+            # Only files waiting for or undergoing processing are polled, so keep this index to the active queue
+            models.Index(
+                fields=['processing_status'],
+                name='dicomfile_active_status_idx',
+                condition=models.Q(processing_status__in=[ProcessingStatus.PENDING, ProcessingStatus.IN_PROGRESS])
+            ),
+            models.Index(fields=['uploaded_by', '-created_at'], name='dicomfile_uploader_created_idx'),
+            # Newest-first file lists read the first page from this index instead of sorting the table
+            models.Index(fields=['-created_at'], name='dicomfile_created_idx'),
+        ]
     
     def __str__(self):
         return self.file.name
 
+    def open_archive(self):
+        '''
+        Open the stored ZIP archive for processing with a large read buffer, and hint the kernel to read ahead since every member is read in order. Returns a django File wrapping the open handle.
+        '''
+        handle = open(self.file.path, 'rb', buffering=ZIP_PROCESSING_BUFFER_SIZE)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return File(handle, name=self.file.name)
+
+    def verify_integrity(self, zip_file=None):
+        '''
+        Verify the CRC of every member in the uploaded ZIP archive by streaming each member through zipfile. This decompresses the whole archive, so it is run by the processing task rather than during upload validation.
+        An already opened zipfile.ZipFile for this file can be passed to avoid reading the central directory again.
+        Returns the name of the first member that fails the check, or None if all members are intact.
+        '''
+        if zip_file is None:
+            with self.open_archive() as archive, zipfile.ZipFile(archive) as zip_file:
+                return self.verify_integrity(zip_file)
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            try:
+                with zip_file.open(member) as member_file:
+                    # ZipExtFile checks the CRC-32 once the member has been read to the end
+                    while member_file.read(1024 * 1024):
+                        pass
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                return member.filename
+        return None
+
 ## Rules related models
 
 class RuleGroup(models.Model):
@@ -160,10 +366,10 @@ class Rule(models.Model):
     '''
     ruleset = models.ForeignKey(Ruleset, on_delete=models.CASCADE,help_text="Ruleset to which the rule belongs to")
     rule_order = models.PositiveIntegerField(help_text="Order of the rule. Rules will be evaluated in the numerical order specified with lower value numbers being evaluated first.")
-    parameter_to_be_matched = models.CharField(max_length=255, null=True, blank=True,help_text="Parameter to be matched. Select from the list or provide your own",choices=ParameterToBeMatchedChoices.choices)
-    matching_operator = models.CharField(max_length=255, null=True, blank=True,help_text="Matching operator to be used. Select from the list or provide your own",choices=MatchingOperatorChoices.choices)
+    parameter_to_be_matched = models.CharField(max_length=32, null=True, blank=True,help_text="Parameter to be matched. Select from the list or provide your own",choices=ParameterToBeMatchedChoices.choices)
+    matching_operator = models.CharField(max_length=48, null=True, blank=True,help_text="Matching operator to be used. Select from the list or provide your own",choices=MatchingOperatorChoices.choices)
     matching_value = models.CharField(max_length=255, null=True, blank=True,help_text="Matching value to be used for the matching")
-    rule_combination_type = models.CharField(max_length=255, null=True, blank=True,help_text="How should the rule be combined with other rules in the ruleset.",choices=CombinationChoices.choices)
+    rule_combination_type = models.CharField(max_length=16, null=True, blank=True,help_text="How should the rule be combined with other rules in the ruleset.",choices=CombinationChoices.choices)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -177,7 +383,7 @@ class Rule(models.Model):
         ]
     
     def __str__(self):
-        return self.parameter_to_be_matched + " " + self.matching_operator + " " + self.matching_value
+        return " ".join(part or "" for part in (self.parameter_to_be_matched, self.matching_operator, self.matching_value))
 
 
 ## Prescription Template related models 
@@ -194,6 +400,23 @@ class TreatmentModalityChoices(models.TextChoices):
     PROTON = 'Proton', 'Proton'
     CARBON = 'Carbon', 'Carbon Ion'
     BRACHYTHERAPY = 'Brachytherapy', 'Brachytherapy'
+
+# Beam energy fields of the prescription template and their names in validation messages
+BEAM_ENERGY_FIELDS = {
+    'ebrt_beam_energy': 'EBRT',
+    'electron_beam_energy': 'Electron',
+    'proton_beam_energy': 'Proton',
+    'carbon_beam_energy': 'Carbon',
+}
+
+# Beam energy field required by each treatment modality (None when no beam energy applies) and the modality name used in validation messages
+MODALITY_BEAM_ENERGY = {
+    TreatmentModalityChoices.EBRT: ('ebrt_beam_energy', 'EBRT'),
+    TreatmentModalityChoices.ELECTRON: ('electron_beam_energy', 'Electron'),
+    TreatmentModalityChoices.PROTON: ('proton_beam_energy', 'Proton'),
+    TreatmentModalityChoices.CARBON: ('carbon_beam_energy', 'Carbon Ion'),
+    TreatmentModalityChoices.BRACHYTHERAPY: (None, 'Brachytherapy'),
+}
  
 class PrescriptionTemplate(models.Model):
     '''
@@ -201,8 +424,8 @@ class PrescriptionTemplate(models.Model):
     '''
     name = models.CharField(max_length=255, unique=True,help_text="Name of the prescription template")
     cancer_site = models.CharField(max_length=255, null=True, blank=True,help_text="Cancer site. Select from the list or provide your own")
-    cancer_side = models.CharField(max_length=255, null=True, blank=True,help_text="Side of the disease. Select from the list.",choices=CancerSideChoices.choices)
-    treatment_modality = models.CharField(max_length=255, null=True, blank=True,help_text="Treatment modality. Select from the list.",choices=TreatmentModalityChoices.choices)
+    cancer_side = models.CharField(max_length=16, null=True, blank=True,help_text="Side of the disease. Select from the list.",choices=CancerSideChoices.choices)
+    treatment_modality = models.CharField(max_length=16, null=True, blank=True,help_text="Treatment modality. Select from the list.",choices=TreatmentModalityChoices.choices)
     ebrt_beam_energy = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, help_text="Beam energy to be used in MV for EBRT")
     electron_beam_energy = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, help_text="Beam energy to be used in MeV for Electron Therapy")
     proton_beam_energy = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, help_text="Beam energy to be used in MeV for Proton Therapy")  
@@ -219,61 +442,16 @@ class PrescriptionTemplate(models.Model):
         super().clean()
         errors = {}
         
-        # Validate that the appropriate beam energy is provided for the selected modality
-        if self.treatment_modality == TreatmentModalityChoices.EBRT:
-            if not self.ebrt_beam_energy:
-                errors['ebrt_beam_energy'] = 'EBRT beam energy is required when treatment modality is EBRT.'
-            # Ensure other modality energies are not provided
-            if self.electron_beam_energy:
-                errors['electron_beam_energy'] = 'Electron beam energy should not be provided when treatment modality is EBRT.'
-            if self.proton_beam_energy:
-                errors['proton_beam_energy'] = 'Proton beam energy should not be provided when treatment modality is EBRT.'
-            if self.carbon_beam_energy:
-                errors['carbon_beam_energy'] = 'Carbon beam energy should not be provided when treatment modality is EBRT.'
-                
-        elif self.treatment_modality == TreatmentModalityChoices.ELECTRON:
-            if not self.electron_beam_energy:
-                errors['electron_beam_energy'] = 'Electron beam energy is required when treatment modality is Electron.'
-            # Ensure other modality energies are not provided
-            if self.ebrt_beam_energy:
-                errors['ebrt_beam_energy'] = 'EBRT beam energy should not be provided when treatment modality is Electron.'
-            if self.proton_beam_energy:
-                errors['proton_beam_energy'] = 'Proton beam energy should not be provided when treatment modality is Electron.'
-            if self.carbon_beam_energy:
-                errors['carbon_beam_energy'] = 'Carbon beam energy should not be provided when treatment modality is Electron.'
-                
-        elif self.treatment_modality == TreatmentModalityChoices.PROTON:
-            if not self.proton_beam_energy:
-                errors['proton_beam_energy'] = 'Proton beam energy is required when treatment modality is Proton.'
-            # Ensure other modality energies are not provided
-            if self.ebrt_beam_energy:
-                errors['ebrt_beam_energy'] = 'EBRT beam energy should not be provided when treatment modality is Proton.'
-            if self.electron_beam_energy:
-                errors['electron_beam_energy'] = 'Electron beam energy should not be provided when treatment modality is Proton.'
-            if self.carbon_beam_energy:
-                errors['carbon_beam_energy'] = 'Carbon beam energy should not be provided when treatment modality is Proton.'
-                
-        elif self.treatment_modality == TreatmentModalityChoices.CARBON:
-            if not self.carbon_beam_energy:
-                errors['carbon_beam_energy'] = 'Carbon beam energy is required when treatment modality is Carbon Ion.'
-            # Ensure other modality energies are not provided
-            if self.ebrt_beam_energy:
-                errors['ebrt_beam_energy'] = 'EBRT beam energy should not be provided when treatment modality is Carbon Ion.'
-            if self.electron_beam_energy:
-                errors['electron_beam_energy'] = 'Electron beam energy should not be provided when treatment modality is Carbon Ion.'
-            if self.proton_beam_energy:
-                errors['proton_beam_energy'] = 'Proton beam energy should not be provided when treatment modality is Carbon Ion.'
-                
-        elif self.treatment_modality == TreatmentModalityChoices.BRACHYTHERAPY:
-            # Brachytherapy doesn't require beam energy, ensure none are provided
-            if self.ebrt_beam_energy:
-                errors['ebrt_beam_energy'] = 'EBRT beam energy should not be provided when treatment modality is Brachytherapy.'
-            if self.electron_beam_energy:
-                errors['electron_beam_energy'] = 'Electron beam energy should not be provided when treatment modality is Brachytherapy.'
-            if self.proton_beam_energy:
-                errors['proton_beam_energy'] = 'Proton beam energy should not be provided when treatment modality is Brachytherapy.'
-            if self.carbon_beam_energy:
-                errors['carbon_beam_energy'] = 'Carbon beam energy should not be provided when treatment modality is Brachytherapy.'
+        # Validate that only the beam energy of the selected modality is provided
+        if self.treatment_modality in MODALITY_BEAM_ENERGY:
+            required_field, modality_name = MODALITY_BEAM_ENERGY[self.treatment_modality]
+            for field, energy_name in BEAM_ENERGY_FIELDS.items():
+                value = getattr(self, field)
+                if field == required_field:
+                    if not value:
+                        errors[field] = f'{energy_name} beam energy is required when treatment modality is {modality_name}.'
+                elif value:
+                    errors[field] = f'{energy_name} beam energy should not be provided when treatment modality is {modality_name}.'
                 
         elif self.treatment_modality:
             errors['treatment_modality'] = 'Invalid treatment modality selected.'
@@ -329,36 +507,103 @@ class GenderChoices(models.TextChoices):
     FEMALE = 'female', 'Female'
     OTHER = 'other', 'Other'
 
+def bulk_upsert_records(model, records, unique_fields, update_fields, batch_size):
+    """
+    Insert or update model rows in batches using INSERT ... ON CONFLICT DO UPDATE.
+    bulk_create does not call save(), so callers are responsible for any derived fields.
+    Callers should wrap this in transaction.atomic() so a failed batch does not leave a partial import.
+    PostgreSQL inserts several rows through UNNEST with casts to the column types, which would silently
+    truncate over-long strings, so string lengths are checked here first.
+
+    Args:
+        model: Model class to write
+        records: Iterable of model instances or dicts of field values
+        unique_fields: Fields identifying an existing row
+        update_fields: Fields overwritten when the row already exists
+        batch_size: Number of rows per INSERT statement
+
+    Returns:
+        List of saved model instances with primary keys set
+
+    Raises:
+        DataError: If a string is longer than its column allows
+    """
+    objs = [record if isinstance(record, model) else model(**record) for record in records]
+    length_limited_fields = [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.CharField) and field.max_length
+    ]
+    for obj in objs:
+        for field in length_limited_fields:
+            value = getattr(obj, field.attname)
+            if value is not None and len(value) > field.max_length:
+                raise DataError(f'Value too long for {model.__name__}.{field.name} (maximum {field.max_length} characters)')
+    return model.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+
 class Patient(models.Model):
     '''
     Model to store information about patient from the DICOM data.
     '''
-    unique_patient_id = models.CharField(max_length=255, unique=True,help_text="Unique Patient ID extracted from DICOM data")
+    unique_patient_id = models.CharField(max_length=64, unique=True,help_text="Unique Patient ID extracted from DICOM data")
     patient_name = models.CharField(max_length=255, null=True, blank=True, help_text="Patient Name extracted from DICOM data")
     patient_dob = models.DateField(null=True, blank=True, help_text="Patient DOB extracted from DICOM data")
-    patient_sex = models.CharField(max_length=10, null=True, blank=True, choices=GenderChoices.choices, help_text="Patient Sex extracted from DICOM data. This is then matched to the Gender choices")
+    patient_sex = models.CharField(max_length=10, null=True, blank=True, choices=GenderChoices.choices, db_index=True, help_text="Patient Sex extracted from DICOM data. This is then matched to the Gender choices")
+    display_name = models.CharField(max_length=255, editable=False, help_text="Patient name and ID used for display and search. This is set automatically on save.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Patients"
 
+    def build_display_name(self):
+        return (f"{self.patient_name} ({self.unique_patient_id})" if self.patient_name else self.unique_patient_id)[:255]
+
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update patients in batches keyed on unique_patient_id. Wrap calls in transaction.atomic().
+        '''
+        objs = [record if isinstance(record, cls) else cls(**record) for record in records]
+        for obj in objs:
+            obj.display_name = obj.build_display_name()
+        return bulk_upsert_records(cls, objs, ['unique_patient_id'], ['patient_name', 'patient_dob', 'patient_sex', 'display_name', 'updated_at'], batch_size)
+
+    def save(self, *args, **kwargs):
+        self.display_name = self.build_display_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'display_name'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
-        return f"{self.patient_name} ({self.unique_patient_id})"
+        return self.display_name
 
 class DICOMStudy(models.Model):
     '''
     Model to store information about study from the DICOM data.
     '''
-    study_instance_uid = models.CharField(max_length=255, unique=True,help_text="DICOM Study Instance UID extracted from the DICOM data.")
+    study_instance_uid = models.CharField(max_length=64, unique=True,help_text="DICOM Study Instance UID extracted from the DICOM data.")
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE,help_text="Patient ID to which the DICOM study refers to.")
     study_description = models.CharField(max_length=255, null=True, blank=True,help_text="Study Description tag data extracted from the DICOM data")
-    study_date = models.DateField(null=True, blank=True,help_text="Study Date tag data extracted from the DICOM data")
+    study_date = models.DateField(null=True, blank=True, db_index=True,help_text="Study Date tag data extracted from the DICOM data")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "DICOM Studies"
+
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update studies in batches keyed on study_instance_uid. Wrap calls in transaction.atomic().
+        '''
+        return bulk_upsert_records(cls, records, ['study_instance_uid'], ['patient', 'study_description', 'study_date', 'updated_at'], batch_size)
     
     def __str__(self):
         return self.study_instance_uid
@@ -367,18 +612,43 @@ class DICOMSeries(models.Model):
     '''
     Model to store information about series from the DICOM data.
     '''
-    series_instance_uid = models.CharField(max_length=255, unique=True,help_text="DICOM Series Instance UID extracted from the DICOM data.")
+    series_instance_uid = models.CharField(max_length=64, unique=True,help_text="DICOM Series Instance UID extracted from the DICOM data.")
     frame_of_reference_uid = models.CharField(max_length=255, null=True, blank=True,help_text="Frame of Reference UID extracted from the DICOM data.")
-    dicom_study = models.ForeignKey(DICOMStudy, on_delete=models.CASCADE,help_text="DICOM Study ID to which the DICOM series refers to.")
+    dicom_study = models.ForeignKey(DICOMStudy, on_delete=models.CASCADE, db_index=False,help_text="DICOM Study ID to which the DICOM series refers to.")
     series_description = models.CharField(max_length=255, null=True, blank=True,help_text="Series Description tag data extracted from the DICOM data")
-    series_date = models.DateField(null=True, blank=True,help_text="Series Date tag data extracted from the DICOM data")
+    series_date = models.DateField(null=True, blank=True, db_index=True,help_text="Series Date tag data extracted from the DICOM data")
+    display_name = models.CharField(max_length=255, editable=False, help_text="Series description and UID used for display and search. This is set automatically on save.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
 
     class Meta:
         verbose_name_plural = "DICOM Series"
+        indexes = [
+            # Also serves lookups on dicom_study alone, so the FK has no separate index
+            models.Index(fields=['dicom_study', 'frame_of_reference_uid'], name='dicomseries_study_frame_idx'),
+        ]
     
+    def build_display_name(self):
+        return (f"{self.series_description} ({self.series_instance_uid})" if self.series_description else self.series_instance_uid)[:255]
+
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update series in batches keyed on series_instance_uid. Wrap calls in transaction.atomic().
+        '''
+        objs = [record if isinstance(record, cls) else cls(**record) for record in records]
+        for obj in objs:
+            obj.display_name = obj.build_display_name()
+        return bulk_upsert_records(cls, objs, ['series_instance_uid'], ['frame_of_reference_uid', 'dicom_study', 'series_description', 'series_date', 'display_name', 'updated_at'], batch_size)
+
+    def save(self, *args, **kwargs):
+        self.display_name = self.build_display_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'display_name'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.series_instance_uid
 
@@ -386,15 +656,26 @@ class DICOMInstance(models.Model):
     '''
     Model to store information about instance from the DICOM data.
     '''
-    sop_instance_uid = models.CharField(max_length = 255, unique=True,help_text="DICOM SOP Instance UID extracted from the DICOM data.")
-    dicom_series = models.ForeignKey(DICOMSeries, on_delete=models.CASCADE,help_text="DICOM Series ID to which the DICOM instance refers to.")
-    modality = models.CharField(max_length=10, null=True, blank=True,help_text="Modality tag data extracted from the DICOM data")
-    pixel_spacing = models.CharField(max_length=255, null=True, blank=True,help_text="Pixel Spacing tag data extracted from the DICOM data")
+    sop_instance_uid = models.CharField(max_length=64, unique=True,help_text="DICOM SOP Instance UID extracted from the DICOM data.")
+    dicom_series = models.ForeignKey(DICOMSeries, on_delete=models.CASCADE, db_index=False,help_text="DICOM Series ID to which the DICOM instance refers to.")
+    modality = models.CharField(max_length=10, null=True, blank=True, db_index=True,help_text="Modality tag data extracted from the DICOM data")
+    pixel_spacing = ArrayField(models.FloatField(), size=2, null=True, blank=True,help_text="Pixel Spacing tag data extracted from the DICOM data as [row spacing, column spacing] in mm")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "DICOM Instances"
+        indexes = [
+            # Also serves lookups on dicom_series alone, so the FK has no separate index
+            models.Index(fields=['dicom_series', 'modality'], name='dicominstance_series_mod_idx'),
+        ]
+
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update instances in batches keyed on sop_instance_uid. Wrap calls in transaction.atomic().
+        '''
+        return bulk_upsert_records(cls, records, ['sop_instance_uid'], ['dicom_series', 'modality', 'pixel_spacing', 'updated_at'], batch_size)
     
     def __str__(self):
         return self.sop_instance_uid
@@ -404,13 +685,13 @@ class ImageInformation(models.Model):
     This model will store information about the individual images in the DICOM dataset if the modality is a CT/MRI/PET. The information stored will include information about the 
     slice location, pixel spacing, slice thickness, patient_position, Image Position (Patient), Image Orientation (Patient),Instance Number. Note that the model uses a one to one relationship between the instance and the image information as one instance can only have one image information.
     '''
-    dicom_instance = models.OneToOneField(DICOMInstance,on_delete=models.CASCADE,help_text="The DICOM Instance ID of the image referenced.")
-    slice_location = models.DecimalField(null=True,blank=True,help_text="The Slice Location value extracted from the DICOM data",decimal_places=5,max_digits=15)
-    pixel_spacing = models.JSONField(null=True,blank=True, help_text = "Pixel spacing value obtained from the DICOM file. The two values represent the distance between the center of the pixels in the row and column respectively.")
-    slice_thickness = models.DecimalField(null=True,blank=True,help_text="Slice thickness values obtained from the DICOM file",decimal_places=5,max_digits=15)
+    dicom_instance = models.OneToOneField(DICOMInstance,on_delete=models.CASCADE,primary_key=True,help_text="The DICOM Instance ID of the image referenced. This is also the primary key.")
+    slice_location = models.FloatField(null=True,blank=True,help_text="The Slice Location value extracted from the DICOM data")
+    pixel_spacing = ArrayField(models.FloatField(), size=2, null=True,blank=True, help_text = "Pixel spacing value obtained from the DICOM file. The two values represent the distance between the center of the pixels in the row and column respectively.")
+    slice_thickness = models.FloatField(null=True,blank=True,help_text="Slice thickness values obtained from the DICOM file")
     patient_position = models.CharField(max_length=255, null=True, blank=True,help_text="Patient Position tag data extracted from the DICOM data")
-    image_position_patient = models.JSONField(null=True, blank=True,help_text="Image Position (Patient) tag data extracted from the DICOM data. It refers to the x, y, and z coordinates of the upper left hand corner of the image; it is the center of the first voxel transmitted")
-    image_orientation_patient = models.JSONField(null=True, blank=True,help_text="Image Orientation (Patient) tag data extracted from the DICOM data. It specifies the direction cosines of the first row and the first column with respect to the patient. These Attributes shall be provide as a pair. Row value for the x, y, and z axes respectively followed by the Column value for the x, y, and z axes respectively.")
+    image_position_patient = ArrayField(models.FloatField(), size=3, null=True, blank=True,help_text="Image Position (Patient) tag data extracted from the DICOM data. It refers to the x, y, and z coordinates of the upper left hand corner of the image; it is the center of the first voxel transmitted")
+    image_orientation_patient = ArrayField(models.FloatField(), size=6, null=True, blank=True,help_text="Image Orientation (Patient) tag data extracted from the DICOM data. It specifies the direction cosines of the first row and the first column with respect to the patient. These Attributes shall be provide as a pair. Row value for the x, y, and z axes respectively followed by the Column value for the x, y, and z axes respectively.")
     instance_number = models.IntegerField(null=True,blank=True,help_text="Instance Number tag data extracted from the DICOM data")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -418,44 +699,87 @@ class ImageInformation(models.Model):
     class Meta:
         verbose_name_plural = "Image Information"
 
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update image information in batches keyed on dicom_instance. Wrap calls in transaction.atomic().
+        '''
+        return bulk_upsert_records(cls, records, ['dicom_instance'], ['slice_location', 'pixel_spacing', 'slice_thickness', 'patient_position', 'image_position_patient', 'image_orientation_patient', 'instance_number', 'updated_at'], batch_size)
+
     def __str__(self):
-        return f"ImageInformation {self.id}"
+        return f"ImageInformation {self.dicom_instance_id}"
 
 class RTStructureSetInformation(models.Model):
     '''
     Model to store information about the RTStructureSet file. This information will include the reference to the dicom instance to which the RTStructureSet file refers to.
     '''
-    dicom_instance = models.OneToOneField(DICOMInstance, on_delete=models.CASCADE,help_text="DICOM Instance ID for the ROI obtained from the RTStructureSet data")
+    dicom_instance = models.OneToOneField(DICOMInstance, on_delete=models.CASCADE,primary_key=True,help_text="DICOM Instance ID for the ROI obtained from the RTStructureSet data. This is also the primary key.")
     number_of_roi = models.IntegerField(null=True, blank=True,help_text="Number of ROIs in the RTStructureSet")
     referenced_frame_of_reference_uid = models.CharField(max_length=255, null=True, blank=True,help_text="Referenced Frame of Reference UID tag data extracted from the RTStructureSet data")
-    prescription_template_id = models.ForeignKey(PrescriptionTemplate, on_delete=models.CASCADE,help_text="Prescription Template ID to which the RTStructureSet belongs to",null=True,blank=True)
+    prescription_template = models.ForeignKey(PrescriptionTemplate, on_delete=models.CASCADE,help_text="Prescription Template ID to which the RTStructureSet belongs to",null=True,blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "RT Structure Set Information"
 
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update RTStructureSet information in batches keyed on dicom_instance. Wrap calls in transaction.atomic().
+        '''
+        return bulk_upsert_records(cls, records, ['dicom_instance'], ['number_of_roi', 'referenced_frame_of_reference_uid', 'prescription_template', 'updated_at'], batch_size)
+
     def __str__(self):
-        return f"RTStructureSetInformation {self.id}"
+        return f"RTStructureSetInformation {self.dicom_instance_id}"
 
 class RTStructureROI(models.Model):
 
     '''
-    Model to store information about volumes of interest (VOIs) from the RTStructureSet File. This data will include the information about the contour points for the specific ROI. Contour point information will be stored in the JSON field and used to reconstruct the contour array.
+    Model to store information about volumes of interest (VOIs) from the RTStructureSet File. This data will include the information about the contour points for the specific ROI. Contour points of all contours are stored as a single packed float32 buffer, and the offsets field records where each contour starts, how many points it has and which image it references.
     '''
     rt_structure_set = models.ForeignKey(RTStructureSetInformation, on_delete=models.CASCADE,help_text="RTStructureSet Information ID for the ROI obtained from the RTStructureSet data")
     roi_number = models.IntegerField(help_text="ROI Number tag data extracted from the RTStructureSet data")
     roi_name = models.CharField(max_length=255, help_text="ROI Name tag data extracted from the RTStructureSet data")
-    roi_contour_data = models.JSONField(help_text="ROI Contour Data tag data extracted from the RTStructureSet data along with corresponding Referenced SOP Instance UID values for each Referenced SOP Instance UID. This will be stored as a tuple.")
+    roi_contour_points = models.BinaryField(default=b'', help_text="ROI Contour Data tag data extracted from the RTStructureSet data for all contours of the ROI, packed as little-endian float32 (x, y, z) triplets.")
+    roi_contour_offsets = models.JSONField(default=list, help_text="One [Referenced SOP Instance UID, first point index, number of points] entry per contour, locating each contour inside the packed contour points.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "RT Structure Regions of Interest"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['rt_structure_set', 'roi_number'],
+                name='unique_rt_structure_set_roi_number'
+            )
+        ]
+
+    @classmethod
+    def bulk_upsert(cls, records, batch_size=1000):
+        '''
+        Insert or update ROIs in batches keyed on (rt_structure_set, roi_number). Wrap calls in transaction.atomic().
+        '''
+        return bulk_upsert_records(cls, records, ['rt_structure_set', 'roi_number'], ['roi_name', 'roi_contour_points', 'roi_contour_offsets', 'updated_at'], batch_size)
 
     def __str__(self):
         return f"RTStructureROI {self.id}"
 
+    @cached_property
+    def points(self):
+        '''
+        All contour points of the ROI as an (N, 3) float32 array.
+        '''
+        return np.frombuffer(self.roi_contour_points, dtype='<f4').reshape(-1, 3)
+
+    @property
+    def contours(self):
+        '''
+        List of (Referenced SOP Instance UID, (n, 3) point array) tuples, one per contour.
+        '''
+        points = self.points
+        return [(referenced_sop_uid, points[start:start + count]) for referenced_sop_uid, start, count in self.roi_contour_offsets]
+
 
 
     
@@ -1,23 +1,135 @@
 import logging
-from celery import shared_task, chain
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from celery import shared_task, group, states
+from celery.utils import uuid
 from celery_progress.backend import ProgressRecorder
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from django_celery_results.models import TaskResult
 
-from app.models import DICOMFile, ProcessingStatus
-from app.utilities.extract_dicom_form_zip import (
-    extract_dicom_from_dicomfile_instance,
-    cleanup_temp_directory
+from app.models import DICOMFile, ProcessingStatus, validate_zip_file_quick, open_zip_archive
+from app.utilities.extract_dicom_form_zip import list_dicom_members, thread_local_zip_opener
+from app.utilities.process_dicom import (
+    process_dicom_batch,
+    read_dicom_member,
+    DICOM_READ_WORKERS,
+    INGEST_BATCH_SIZE,
+    SKIPPED_FILE_ERRORS
 )
-from app.utilities.process_dicom import process_dicom_files
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True)
+def _ingest_zip_members(archive_path, members, progress_recorder):
+    """
+    Parse the given members of a ZIP archive and store their metadata, reporting progress
+    in the 40% to 90% range.
+    
+    Members are processed in batches with process_dicom_batch, which writes each model of the batch
+    with one bulk upsert; each batch is committed in its own transaction. Progress is reported between
+    batches, once the batch is committed and visible to the progress page. Members are parsed by a thread
+    pool, each thread reading through its own buffered handle, while the database writes stay on this
+    thread, in archive order.
+    
+    Args:
+        archive_path: Path of the ZIP archive containing the members
+        members: List of ZipInfo entries to process
+        progress_recorder: ProgressRecorder of the calling task
+        
+    Returns:
+        Dictionary with processing results
+    """
+    results = {
+        'total_files': len(members),
+        'successful': 0,
+        'failed': 0,
+        'skipped': 0,
+        'file_results': []
+    }
+    
+    last_progress_percent = None
+    def read_member(file_info):
+        return read_dicom_member(get_zip_file(), file_info)
+    
+    with thread_local_zip_opener(archive_path) as get_zip_file, ThreadPoolExecutor(max_workers=DICOM_READ_WORKERS) as executor:
+        for batch_start in range(0, len(members), INGEST_BATCH_SIZE):
+            batch = members[batch_start:batch_start + INGEST_BATCH_SIZE]
+            dataset_futures = [executor.submit(read_member, file_info) for file_info in batch]
+            
+            # Processed copies are made from the original members, read through this thread's handle
+            zip_file = get_zip_file()
+            with transaction.atomic():
+                batch_results = process_dicom_batch(
+                    [file_info.filename for file_info in batch],
+                    dataset_futures=dataset_futures,
+                    original_openers=[partial(zip_file.open, file_info) for file_info in batch]
+                )
+                for file_result in batch_results:
+                    results['file_results'].append(file_result)
+                    
+                    if file_result['success']:
+                        results['successful'] += 1
+                    elif file_result.get('error') in SKIPPED_FILE_ERRORS:
+                        results['skipped'] += 1
+                    else:
+                        results['failed'] += 1
+            
+            # Calculate progress (40% to 90% range for processing). Each update is a result backend
+            # write, so only report when the percentage changes
+            processed_count = batch_start + len(batch)
+            progress_percent = 40 + int((processed_count / len(members)) * 50)
+            if progress_percent != last_progress_percent:
+                progress_recorder.set_progress(
+                    progress_percent, 
+                    100, 
+                    description=f"Processing file {processed_count}/{len(members)}"
+                )
+                last_progress_percent = progress_percent
+    
+    return results
+
+
+def _claim_owner_gone(claim, hostname):
+    """
+    Check whether the worker process that made a claim on a DICOMFile has exited.
+    
+    Only processes on this host can be checked; claims made elsewhere are treated as alive
+    and are left to expire with the task time limit.
+    
+    Args:
+        claim: processing_log_data of the claimed file, with the hostname and pid of its owner
+        hostname: Node name of the current worker
+        
+    Returns:
+        True if the owning process is known to be gone
+    """
+    if claim.get('hostname') != hostname or not claim.get('pid'):
+        return False
+    if claim['pid'] == os.getpid():
+        return False
+    try:
+        os.kill(claim['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # The pid exists but belongs to another user
+        pass
+    return False
+
+
+# Archives can take minutes to process, so the message is only acknowledged once the task has finished
+# and is redelivered if the worker dies. The task is routed to the dicom_heavy queue (CELERY_TASK_ROUTES).
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
 def process_dicom_file_task(self, dicom_file_id):
     """
-    Celery task chain to extract and process DICOM files from a ZIP archive.
-    This task orchestrates the entire workflow with progress tracking.
+    Celery task to validate a ZIP archive and ingest the DICOM files it contains.
+    Members are read straight from the archive and their metadata stored in batches, with progress tracking.
     
     Args:
         dicom_file_id: ID of the DICOMFile model instance
@@ -26,81 +138,140 @@ def process_dicom_file_task(self, dicom_file_id):
         Dictionary with processing results
     """
     progress_recorder = ProgressRecorder(self)
-    temp_dir = None
     
     try:
-        # Get the DICOMFile instance
+        # Get the DICOMFile instance. Only the stored file is needed; status changes
+        # below are written with targeted UPDATEs on this queryset
         progress_recorder.set_progress(0, 100, description="Initializing...")
-        dicom_file = DICOMFile.objects.get(id=dicom_file_id)
+        dicom_file = DICOMFile.objects.only('id', 'file').get(id=dicom_file_id)
+        dicom_file_qs = DICOMFile.objects.filter(id=dicom_file_id)
         
-        # Update status to in_progress
-        dicom_file.processing_status = ProcessingStatus.IN_PROGRESS
-        dicom_file.save()
+        # Claim the file with a single conditional UPDATE. Pending and failed files can be claimed,
+        # as can in-progress files not yet claimed by another task (dispatchers mark files in progress
+        # before queueing them). Any claim older than the hard time limit is taken over whatever its task id,
+        # since the run that made it has been killed by then (such a message is acknowledged and not
+        # redelivered). A claim by this task id whose worker process is gone is taken over below.
+        # Completed files and files owned by a running task are skipped, including a message redelivered
+        # while its first run is still going (the broker's consumer timeout), which carries the same task id.
+        claim = {
+            'task_id': self.request.id,
+            'hostname': self.request.hostname,
+            'pid': os.getpid(),
+            'started_at': timezone.now().isoformat()
+        }
+        stale_before = timezone.now() - timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT)
+        claimed = dicom_file_qs.filter(
+            Q(processing_status__in=[ProcessingStatus.PENDING, ProcessingStatus.FAILED])
+            | Q(processing_status=ProcessingStatus.IN_PROGRESS) & (
+                Q(processing_log_data__isnull=True)
+                | ~Q(processing_log_data__has_key='task_id')
+                | Q(updated_at__lte=stale_before)
+            )
+        ).update(
+            processing_status=ProcessingStatus.IN_PROGRESS,
+            processing_log_data=claim,
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            # Take over a claim made by this task id in a worker process that has since died.
+            # The UPDATE is guarded by the claim that was read, so only one redelivery wins.
+            previous_claim = dicom_file_qs.filter(
+                processing_status=ProcessingStatus.IN_PROGRESS,
+                processing_log_data__task_id=self.request.id
+            ).values_list('processing_log_data', flat=True).first()
+            if previous_claim and _claim_owner_gone(previous_claim, self.request.hostname):
+                logger.warning(f"Reclaiming DICOMFile ID {dicom_file_id}: worker process {previous_claim.get('pid')} is gone")
+                claimed = dicom_file_qs.filter(
+                    processing_status=ProcessingStatus.IN_PROGRESS,
+                    processing_log_data=previous_claim
+                ).update(
+                    processing_log_data=claim,
+                    updated_at=timezone.now()
+                )
+        if not claimed:
+            logger.info(f"Skipping DICOMFile ID {dicom_file_id}: already in progress or completed")
+            progress_recorder.set_progress(100, 100, description="Skipped: already in progress or completed")
+            return {
+                'status': 'skipped',
+                'dicom_file_id': dicom_file_id,
+                'reason': 'already in progress or completed'
+            }
         
         logger.info(f"Starting processing for DICOMFile ID: {dicom_file_id}")
         
-        # Step 1: Extract ZIP file
-        progress_recorder.set_progress(10, 100, description="Extracting ZIP archive...")
-        logger.info("Extracting DICOM files from ZIP archive")
-        
-        temp_dir, dicom_files = extract_dicom_from_dicomfile_instance(dicom_file)
-        
-        logger.info(f"Extracted {len(dicom_files)} files from ZIP archive")
-        progress_recorder.set_progress(30, 100, description=f"Extracted {len(dicom_files)} files")
-        
-        # Step 2: Process DICOM files
-        progress_recorder.set_progress(40, 100, description="Processing DICOM files...")
-        logger.info(f"Processing {len(dicom_files)} DICOM files")
-        
-        # Process files with progress updates
-        results = {
-            'total_files': len(dicom_files),
-            'successful': 0,
-            'failed': 0,
-            'skipped': 0,
-            'file_results': []
-        }
-        
-        for idx, file_path in enumerate(dicom_files, 1):
-            # Calculate progress (40% to 90% range for processing)
-            progress_percent = 40 + int((idx / len(dicom_files)) * 50)
-            progress_recorder.set_progress(
-                progress_percent, 
-                100, 
-                description=f"Processing file {idx}/{len(dicom_files)}"
-            )
-            
-            # Import here to avoid circular imports
-            from app.utilities.process_dicom import process_single_dicom_file
-            
-            file_result = process_single_dicom_file(file_path)
-            results['file_results'].append(file_result)
+        # Run the full ZIP validation that is skipped on upload, then verify and read
+        # the archive through one ZipFile so the central directory is only parsed once
+        progress_recorder.set_progress(5, 100, description="Verifying ZIP archive integrity...")
+        with dicom_file.open_archive() as archive:
+            try:
+                validate_zip_file_quick(archive)
+                zip_file = open_zip_archive(archive)
+            except ValidationError as e:
+                error_msg = ' '.join(e.messages)
+                logger.error(f"ZIP validation failed for DICOMFile ID {dicom_file_id}: {error_msg}")
+                dicom_file_qs.update(
+                    processing_status=ProcessingStatus.FAILED,
+                    processing_log_data={
+                        'error': error_msg,
+                        'failed_at': timezone.now().isoformat()
+                    },
+                    updated_at=timezone.now()
+                )
+                progress_recorder.set_progress(100, 100, description=f"Error: {error_msg}")
+                return {
+                    'status': 'failed',
+                    'error': error_msg
+                }
             
-            if file_result['success']:
-                results['successful'] += 1
-            elif file_result.get('error') == "Modality tag not present":
-                results['skipped'] += 1
-            else:
-                results['failed'] += 1
-        
-        # Step 3: Cleanup
-        progress_recorder.set_progress(95, 100, description="Cleaning up temporary files...")
-        logger.info("Cleaning up temporary directory")
-        cleanup_temp_directory(temp_dir)
-        
-        # Step 4: Update DICOMFile status
+            with zip_file:
+                # Verify the CRC of every archive member before anything is read or stored
+                corrupted_member = dicom_file.verify_integrity(zip_file)
+                if corrupted_member:
+                    error_msg = f'Corrupted ZIP file. File "{corrupted_member}" failed integrity check.'
+                    logger.error(f"Integrity check failed for DICOMFile ID {dicom_file_id}: {error_msg}")
+                    dicom_file_qs.update(
+                        processing_status=ProcessingStatus.FAILED,
+                        processing_log_data={
+                            'error': error_msg,
+                            'corrupted_member': corrupted_member,
+                            'failed_at': timezone.now().isoformat()
+                        },
+                        updated_at=timezone.now()
+                    )
+                    progress_recorder.set_progress(100, 100, description=f"Error: {error_msg}")
+                    return {
+                        'status': 'failed',
+                        'error': error_msg
+                    }
+                
+                # Step 1: List the DICOM files in the archive. They are read straight from the
+                # archive, so nothing is extracted to a temporary directory.
+                progress_recorder.set_progress(10, 100, description="Reading ZIP archive...")
+                members = list_dicom_members(zip_file)
+                logger.info(f"Found {len(members)} files in ZIP archive")
+                progress_recorder.set_progress(30, 100, description=f"Found {len(members)} files")
+                
+                # Step 2: Process DICOM files
+                progress_recorder.set_progress(40, 100, description="Processing DICOM files...")
+                logger.info(f"Processing {len(members)} DICOM files")
+                results = _ingest_zip_members(dicom_file.file.path, members, progress_recorder)
+        
+        # Step 3: Update DICOMFile status
         progress_recorder.set_progress(98, 100, description="Finalizing...")
         
-        dicom_file.processing_status = ProcessingStatus.COMPLETED
-        dicom_file.date_processing_completed = timezone.now()
-        dicom_file.processing_log_data = {
-            'total_files': results['total_files'],
-            'successful': results['successful'],
-            'failed': results['failed'],
-            'skipped': results['skipped'],
-            'completed_at': timezone.now().isoformat()
-        }
-        dicom_file.save()
+        completed_at = timezone.now()
+        dicom_file_qs.update(
+            processing_status=ProcessingStatus.COMPLETED,
+            date_processing_completed=completed_at,
+            processing_log_data={
+                'total_files': results['total_files'],
+                'successful': results['successful'],
+                'failed': results['failed'],
+                'skipped': results['skipped'],
+                'completed_at': completed_at.isoformat()
+            },
+            updated_at=completed_at
+        )
         
         logger.info(
             f"Processing completed for DICOMFile ID: {dicom_file_id}. "
@@ -135,23 +306,17 @@ def process_dicom_file_task(self, dicom_file_id):
         
         # Update status to failed
         try:
-            dicom_file = DICOMFile.objects.get(id=dicom_file_id)
-            dicom_file.processing_status = ProcessingStatus.FAILED
-            dicom_file.processing_log_data = {
-                'error': error_msg,
-                'failed_at': timezone.now().isoformat()
-            }
-            dicom_file.save()
+            DICOMFile.objects.filter(id=dicom_file_id).update(
+                processing_status=ProcessingStatus.FAILED,
+                processing_log_data={
+                    'error': error_msg,
+                    'failed_at': timezone.now().isoformat()
+                },
+                updated_at=timezone.now()
+            )
         except Exception:
             pass
         
-        # Cleanup temp directory if it exists
-        if temp_dir:
-            try:
-                cleanup_temp_directory(temp_dir)
-            except Exception:
-                pass
-        
         progress_recorder.set_progress(100, 100, description=f"Error: {error_msg}")
         
         return {
@@ -160,10 +325,53 @@ def process_dicom_file_task(self, dicom_file_id):
         }
 
 
+def record_pending_tasks(task_ids):
+    """
+    Store a PENDING result for each DICOM processing task before it is published.
+    The result backend otherwise reports a queued task and an ID that was never issued
+    the same way, so the status views use these rows to tell them apart.
+    The worker overwrites the row once the task starts.
+    
+    Args:
+        task_ids: List of Celery task IDs about to be published
+    """
+    TaskResult.objects.bulk_create(
+        [TaskResult(task_id=task_id, task_name=process_dicom_file_task.name, status=states.PENDING) for task_id in task_ids],
+        ignore_conflicts=True
+    )
+
+
+def discard_pending_tasks(task_ids):
+    """
+    Delete the PENDING results stored by record_pending_tasks for tasks that were never published.
+    Rows a worker has already picked up are left alone.
+    
+    Args:
+        task_ids: List of Celery task IDs whose dispatch failed
+    """
+    TaskResult.objects.filter(task_id__in=task_ids, status=states.PENDING).delete()
+
+
+def queue_dicom_file_task(dicom_file_id):
+    """
+    Publish process_dicom_file_task for one DICOM file, recording it as pending first.
+    
+    Args:
+        dicom_file_id: ID of the DICOMFile to process
+        
+    Returns:
+        Task ID of the published task
+    """
+    task_id = uuid()
+    record_pending_tasks([task_id])
+    process_dicom_file_task.apply_async(args=[dicom_file_id], task_id=task_id)
+    return task_id
+
+
 @shared_task
 def process_multiple_dicom_files(dicom_file_ids):
     """
-    Process multiple DICOM files in sequence.
+    Queue processing of multiple DICOM files as one Celery group, so workers can run them in parallel.
     
     Args:
         dicom_file_ids: List of DICOMFile IDs to process
@@ -171,9 +379,13 @@ def process_multiple_dicom_files(dicom_file_ids):
     Returns:
         List of task IDs
     """
-    task_ids = []
-    for dicom_file_id in dicom_file_ids:
-        task = process_dicom_file_task.delay(dicom_file_id)
-        task_ids.append(task.id)
+    # Publish all tasks as one group over a single producer. Task IDs are generated
+    # here so the group result never has to be read back.
+    task_ids = [uuid() for _ in dicom_file_ids]
+    record_pending_tasks(task_ids)
+    group(
+        process_dicom_file_task.s(dicom_file_id).set(task_id=task_id)
+        for dicom_file_id, task_id in zip(dicom_file_ids, task_ids)
+    ).apply_async()
     
     return task_ids
@@ -1,3 +1,428 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+import pydicom
+from celery.utils.nodenames import gethostname
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import DataError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+from pydicom.data import get_testdata_file
+
+from app.admin import EstimatedCountPaginator
+from app.models import (
+    DICOMFile, ProcessingStatus, Patient, DICOMStudy, DICOMInstance,
+    ImageInformation, RTStructureSetInformation, RTStructureROI,
+    validate_zip_file_quick, validate_zip_file_full, open_zip_archive, check_zip_uncompressed_size, _find_eocd
+)
+from app.tasks import process_dicom_file_task, record_pending_tasks
+from app.utilities import process_dicom
+
+
+def make_zip(members):
+    """
+    Build an in-memory ZIP archive.
+
+    Args:
+        members: Dictionary of member name to bytes content
+
+    Returns:
+        bytes of the ZIP archive
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in members.items():
+            zip_file.writestr(name, content)
+    return buffer.getvalue()
+
+
+class ProcessDicomFileTaskClaimTests(TestCase):
+    """
+    Which DICOMFile states process_dicom_file_task claims and which it skips.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        user = User.objects.create(username='uploader')
+        self.dicom_file = DICOMFile.objects.create(
+            file=ContentFile(make_zip({'readme.txt': b'not dicom'}), name='upload.zip'),
+            uploaded_by=user
+        )
+        self.dicom_file_qs = DICOMFile.objects.filter(id=self.dicom_file.id)
+
+    def set_state(self, status, log_data=None, age=timedelta()):
+        self.dicom_file_qs.update(
+            processing_status=status,
+            processing_log_data=log_data,
+            updated_at=timezone.now() - age
+        )
+
+    def run_task(self, task_id='task-1'):
+        return process_dicom_file_task.apply(args=[self.dicom_file.id], task_id=task_id).result
+
+    def assertClaimed(self, result):
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(self.dicom_file_qs.get().processing_status, ProcessingStatus.COMPLETED)
+
+    def assertSkipped(self, result, status=ProcessingStatus.IN_PROGRESS):
+        self.assertEqual(result['status'], 'skipped')
+        self.assertEqual(self.dicom_file_qs.get().processing_status, status)
+
+    def test_pending_file_is_claimed(self):
+        self.assertClaimed(self.run_task())
+
+    def test_failed_file_is_claimed(self):
+        self.set_state(ProcessingStatus.FAILED, {'error': 'earlier failure'})
+        self.assertClaimed(self.run_task())
+
+    def test_completed_file_is_skipped(self):
+        self.set_state(ProcessingStatus.COMPLETED, {'total_files': 1})
+        self.assertSkipped(self.run_task(), ProcessingStatus.COMPLETED)
+
+    def test_in_progress_file_with_null_log_is_claimed(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS)
+        self.assertClaimed(self.run_task())
+
+    def test_in_progress_file_without_task_id_is_claimed(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'queued_at': timezone.now().isoformat()})
+        self.assertClaimed(self.run_task())
+
+    def test_live_claim_by_other_task_is_skipped(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-2'})
+        self.assertSkipped(self.run_task())
+
+    def test_live_claim_by_same_task_is_skipped(self):
+        # A message redelivered while its first run is still going
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-1', 'hostname': gethostname(), 'pid': os.getpid()})
+        self.assertSkipped(self.run_task())
+
+    def test_own_stale_claim_is_reclaimed(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-1'}, age=timedelta(hours=1))
+        self.assertClaimed(self.run_task())
+
+    def test_foreign_stale_claim_is_reclaimed(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-2'}, age=timedelta(hours=1))
+        self.assertClaimed(self.run_task())
+
+    def test_own_claim_by_exited_process_is_reclaimed(self):
+        dead_pid = 2 ** 22 + 1
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-1', 'hostname': gethostname(), 'pid': dead_pid})
+        with self.assertLogs('app.tasks', level='WARNING'):
+            result = self.run_task()
+        self.assertClaimed(result)
+
+    def test_own_claim_on_other_host_is_skipped(self):
+        self.set_state(ProcessingStatus.IN_PROGRESS, {'task_id': 'task-1', 'hostname': 'celery@elsewhere', 'pid': 2 ** 22 + 1})
+        self.assertSkipped(self.run_task())
+
+
+class BulkUpsertTests(TestCase):
+    """
+    bulk_upsert_records and the per-model bulk_upsert class methods.
+    """
+
+    def test_conflicting_rows_are_updated_in_place(self):
+        first, _ = Patient.bulk_upsert([
+            {'unique_patient_id': 'P1', 'patient_name': 'Old Name'},
+            {'unique_patient_id': 'P2', 'patient_name': 'Other'},
+        ])
+        updated, added = Patient.bulk_upsert([
+            {'unique_patient_id': 'P1', 'patient_name': 'New Name'},
+            {'unique_patient_id': 'P3'},
+        ])
+        
+        self.assertEqual(updated.pk, first.pk)
+        self.assertIsNotNone(added.pk)
+        self.assertEqual(Patient.objects.count(), 3)
+        patient = Patient.objects.get(unique_patient_id='P1')
+        self.assertEqual(patient.patient_name, 'New Name')
+        self.assertEqual(patient.display_name, 'New Name (P1)')
+
+    def test_conflicting_row_is_moved_to_new_parent(self):
+        first_patient, second_patient = Patient.bulk_upsert([{'unique_patient_id': 'P1'}, {'unique_patient_id': 'P2'}])
+        DICOMStudy.bulk_upsert([{'study_instance_uid': '1.2.3', 'patient_id': first_patient.pk}])
+        DICOMStudy.bulk_upsert([{'study_instance_uid': '1.2.3', 'patient_id': second_patient.pk, 'study_description': 'Planning CT'}])
+        
+        study = DICOMStudy.objects.get()
+        self.assertEqual(study.patient_id, second_patient.pk)
+        self.assertEqual(study.study_description, 'Planning CT')
+
+    def test_too_long_value_raises_data_error(self):
+        with self.assertRaisesMessage(DataError, 'Patient.unique_patient_id'):
+            Patient.bulk_upsert([{'unique_patient_id': 'P1'}, {'unique_patient_id': 'X' * 80}])
+        self.assertFalse(Patient.objects.exists())
+
+
+class ProcessDicomBatchTests(TestCase):
+    """
+    process_dicom_batch with members read from a ZIP archive, as the processing task calls it.
+    """
+
+    def setUp(self):
+        processed_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, processed_root, ignore_errors=True)
+        root_patch = mock.patch.object(process_dicom, 'PROCESSED_DICOM_ROOT', processed_root)
+        root_patch.start()
+        self.addCleanup(root_patch.stop)
+        process_dicom._processed_series_directory.cache_clear()
+        self.addCleanup(process_dicom._processed_series_directory.cache_clear)
+
+    def read_test_file(self, name, **changes):
+        dataset = pydicom.dcmread(get_testdata_file(name), force=True)
+        for keyword, value in changes.items():
+            setattr(dataset, keyword, value)
+        return dataset
+
+    def run_batch(self, datasets):
+        """
+        Write the datasets to a ZIP archive and process its members as one batch.
+
+        Args:
+            datasets: Dictionary of member name to pydicom Dataset
+
+        Returns:
+            List of per-file result dictionaries
+        """
+        members = {}
+        for name, dataset in datasets.items():
+            buffer = io.BytesIO()
+            dataset.save_as(buffer)
+            members[name] = buffer.getvalue()
+        zip_file = zipfile.ZipFile(io.BytesIO(make_zip(members)))
+        self.addCleanup(zip_file.close)
+        
+        infos = zip_file.infolist()
+        return process_dicom.process_dicom_batch(
+            [info.filename for info in infos],
+            dataset_futures=[process_dicom._completed_future(process_dicom.read_dicom_member(zip_file, info)) for info in infos],
+            original_openers=[partial(zip_file.open, info) for info in infos]
+        )
+
+    def test_batch_is_written_with_one_bulk_write(self):
+        with mock.patch.object(process_dicom, 'process_single_dicom_file') as process_single_dicom_file:
+            results = self.run_batch({
+                'ct.dcm': self.read_test_file('CT_small.dcm'),
+                'mr.dcm': self.read_test_file('MR_small.dcm'),
+                'rtstruct.dcm': self.read_test_file('rtstruct.dcm'),
+            })
+        
+        process_single_dicom_file.assert_not_called()
+        self.assertEqual([result['success'] for result in results], [True, True, True])
+        self.assertEqual(DICOMInstance.objects.count(), 3)
+        self.assertEqual(ImageInformation.objects.count(), 2)
+        self.assertEqual(RTStructureSetInformation.objects.count(), 1)
+        self.assertTrue(RTStructureROI.objects.exists())
+        for result in results:
+            self.assertTrue(DICOMInstance.objects.filter(sop_instance_uid=result['sop_instance_uid']).exists())
+
+    def test_failed_bulk_write_falls_back_to_per_file_processing(self):
+        with self.assertLogs(process_dicom.logger, level='WARNING') as logs:
+            results = self.run_batch({
+                'ct.dcm': self.read_test_file('CT_small.dcm'),
+                'long_id.dcm': self.read_test_file('CT_small.dcm', PatientID='X' * 80, SOPInstanceUID='1.2.3.4'),
+                'mr.dcm': self.read_test_file('MR_small.dcm'),
+            })
+        
+        self.assertTrue(any('processing them one at a time' in message for message in logs.output))
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertIn('too long', results[1]['error'].lower())
+        self.assertEqual(
+            set(DICOMInstance.objects.values_list('sop_instance_uid', flat=True)),
+            {results[0]['sop_instance_uid'], results[2]['sop_instance_uid']}
+        )
+        self.assertEqual(ImageInformation.objects.count(), 2)
+        self.assertFalse(Patient.objects.filter(unique_patient_id__startswith='XXX').exists())
+
+    def test_unreadable_file_fails_on_its_own(self):
+        datasets = {
+            'ct.dcm': self.read_test_file('CT_small.dcm'),
+            'mr.dcm': self.read_test_file('MR_small.dcm'),
+        }
+        patient_values = [ValueError('Bad patient'), process_dicom.get_patient_values(datasets['mr.dcm'])]
+        with mock.patch.object(process_dicom, 'get_patient_values', side_effect=patient_values), \
+                self.assertLogs(process_dicom.logger, level='ERROR'):
+            results = self.run_batch(datasets)
+        
+        self.assertEqual([result['success'] for result in results], [False, True])
+        self.assertEqual(results[0]['error'], 'Bad patient')
+        self.assertEqual(DICOMInstance.objects.count(), 1)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """
+    EstimatedCountPaginator switches from COUNT(*) to the planner estimate above its threshold.
+    """
+
+    def setUp(self):
+        Patient.bulk_upsert({'unique_patient_id': f'P{number}'} for number in range(5))
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Patient._meta.db_table}')
+        # Rows added after ANALYZE are only seen by an exact count
+        Patient.bulk_upsert({'unique_patient_id': f'Q{number}'} for number in range(3))
+
+    def paginator(self, queryset, threshold):
+        paginator = EstimatedCountPaginator(queryset, 2)
+        paginator.estimate_threshold = threshold
+        return paginator
+
+    def test_estimate_is_used_at_or_above_threshold(self):
+        self.assertEqual(self.paginator(Patient.objects.order_by('id'), 5).count, 5)
+
+    def test_exact_count_is_used_below_threshold(self):
+        self.assertEqual(self.paginator(Patient.objects.order_by('id'), 6).count, 8)
+
+    def test_filtered_list_uses_exact_count(self):
+        queryset = Patient.objects.filter(unique_patient_id__startswith='Q').order_by('id')
+        self.assertEqual(self.paginator(queryset, 0).count, 3)
+
+
+class ProcessSelectedFilesTests(TestCase):
+    """
+    The bulk processing admin action cleans up after a failed dispatch.
+    """
+
+    def setUp(self):
+        user = User.objects.create(username='uploader')
+        self.dicom_file = DICOMFile.objects.create(file='upload.zip', uploaded_by=user)
+        self.model_admin = admin.site._registry[DICOMFile]
+        self.request = RequestFactory().post('/')
+
+    @mock.patch('app.admin.group')
+    @mock.patch('app.admin.process_dicom_file_task')
+    def test_failed_dispatch_discards_pending_results(self, task, group):
+        group.return_value.apply_async.side_effect = OSError('broker unreachable')
+        # A result from an earlier dispatch is not touched
+        record_pending_tasks(['earlier-task'])
+
+        with mock.patch.object(self.model_admin, 'message_user') as message_user, self.assertLogs('app.admin', 'ERROR'):
+            response = self.model_admin.process_selected_files(self.request, DICOMFile.objects.all())
+
+        self.assertIsNone(response)
+        self.assertEqual(list(TaskResult.objects.values_list('task_id', flat=True)), ['earlier-task'])
+        self.dicom_file.refresh_from_db()
+        self.assertEqual(self.dicom_file.processing_status, ProcessingStatus.PENDING)
+        message_user.assert_called_once()
+        self.assertEqual(message_user.call_args.args[2], messages.ERROR)
+
+
+class ZipValidationTests(SimpleTestCase):
+    """
+    Upload-time and processing-time checks of ZIP archives, run without the database.
+    """
+
+    def setUp(self):
+        self.archive = make_zip({'series/IM1.dcm': b'\0' * 128 + b'DICM' + os.urandom(2000), 'series/IM2.dcm': b'x' * 5000})
+
+    def write_temp(self, content):
+        handle, path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def temporary_upload(self, content):
+        upload = TemporaryUploadedFile('upload.zip', 'application/zip', len(content), None)
+        upload.write(content)
+        upload.seek(0)
+        self.addCleanup(upload.close)
+        return upload
+
+    def test_valid_archive_passes(self):
+        validate_zip_file_quick(SimpleUploadedFile('upload.zip', self.archive))
+        validate_zip_file_full(SimpleUploadedFile('upload.zip', self.archive))
+        validate_zip_file_full(self.temporary_upload(self.archive))
+
+    def test_wrong_extension_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'Invalid file extension'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.tar', self.archive))
+
+    @override_settings(ICON_MAX_ZIP_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'exceeds maximum size'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.zip', self.archive))
+
+    def test_file_smaller_than_eocd_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'too small'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.zip', b'PK\x03\x04'))
+
+    def test_file_without_zip_signature_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'ZIP signature'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.zip', os.urandom(4096)))
+
+    def test_spanned_archive_marker_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'ZIP signature'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.zip', b'PK\x07\x08' + self.archive))
+
+    def test_unidentified_binary_with_zip_signature_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'MIME type'):
+            validate_zip_file_quick(SimpleUploadedFile('upload.zip', b'PK\x03\x04' + os.urandom(4096)))
+
+    def test_truncated_archive_is_rejected(self):
+        truncated = self.archive[:len(self.archive) // 2]
+        validate_zip_file_quick(SimpleUploadedFile('upload.zip', truncated))
+        with self.assertRaisesMessage(ValidationError, 'Invalid or corrupted ZIP file.'):
+            validate_zip_file_full(SimpleUploadedFile('upload.zip', truncated))
+        with self.assertRaisesMessage(ValidationError, 'Invalid or corrupted ZIP file.'):
+            validate_zip_file_full(self.temporary_upload(truncated))
+
+    def test_archive_with_damaged_central_directory_is_rejected(self):
+        # The EOCD is present but points at a central directory that is not there
+        eocd_offset = self.archive.rfind(b'PK\x05\x06')
+        damaged = self.archive[:eocd_offset - 40] + self.archive[eocd_offset:]
+        with self.assertRaises(ValidationError):
+            with open_zip_archive(io.BytesIO(damaged)):
+                pass
+
+    def test_find_eocd_locates_record(self):
+        self.assertEqual(_find_eocd(self.write_temp(self.archive)), len(self.archive) - 22)
+
+    def test_find_eocd_skips_archive_comment(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zip_file:
+            # Large enough for the search window to start past an mmap page boundary
+            zip_file.writestr('IM1.dcm', os.urandom(300000))
+            zip_file.comment = b'c' * 65535
+        content = buffer.getvalue()
+        self.assertEqual(_find_eocd(self.write_temp(content)), len(content) - 22 - 65535)
+
+    def test_find_eocd_without_record(self):
+        self.assertEqual(_find_eocd(self.write_temp(self.archive[:-22])), -1)
+        self.assertEqual(_find_eocd(self.write_temp(os.urandom(100000))), -1)
+        self.assertEqual(_find_eocd(self.write_temp(b'PK\x05\x06')), -1)
+
+    @override_settings(ICON_MAX_ZIP_MEMBER_SIZE=4096)
+    def test_oversized_member_is_rejected(self):
+        with zipfile.ZipFile(io.BytesIO(self.archive)) as zip_file:
+            with self.assertRaisesMessage(ValidationError, 'series/IM2.dcm'):
+                check_zip_uncompressed_size(zip_file)
+
+    @override_settings(ICON_MAX_ZIP_UNCOMPRESSED_SIZE=6000)
+    def test_oversized_archive_is_rejected(self):
+        with zipfile.ZipFile(io.BytesIO(self.archive)) as zip_file:
+            with self.assertRaisesMessage(ValidationError, 'ZIP archive is too large'):
+                check_zip_uncompressed_size(zip_file)
+        with self.assertRaisesMessage(ValidationError, 'ZIP archive is too large'):
+            validate_zip_file_full(SimpleUploadedFile('upload.zip', self.archive))
@@ -6,6 +6,8 @@ urlpatterns = [
     path('upload/', views.upload_dicom_file, name='upload_dicom_file'),
     path('process/<int:dicom_file_id>/', views.process_dicom_file_view, name='process_dicom_file'),
     path('processing/progress/', views.dicom_processing_progress, name='dicom_processing_progress'),
+    path('api/task-status/batch/', views.task_status_batch, name='task_status_batch'),
+    path('api/task-status/stream/', views.task_status_stream, name='task_status_stream'),
     path('api/task-status/<str:task_id>/', views.task_status, name='task_status'),
     path('manage-files/', views.manage_files, name='manage_files'),
     path('patients/', views.view_patients, name='view_patients'),
@@ -1,128 +1,95 @@
-# This function will extract all files from an uploaded ZIP file into a temporary directory and return the path of the files extracted from the zip file. If the files are present inside nested subdirectories it will unnest them during the extraction process. 
+# Helpers to find the DICOM files in an uploaded ZIP archive and read them in place, without extracting them to disk.
 
 import os
 import zipfile
-import tempfile
-import shutil
-from pathlib import Path
-from typing import List, Tuple
+import threading
+from contextlib import contextmanager
+from typing import List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Buffer size of the file handles archive members are read through
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+# DICOM files start with a 128 byte preamble followed by the DICM marker
+DICOM_PREAMBLE_SIZE = 132
+# Extensions that are always treated as DICOM files, even without the DICM marker
+DICOM_EXTENSIONS = frozenset({'', '.dcm', '.dicom'})
 
-def extract_dicom_from_zip(zip_file_path: str) -> Tuple[str, List[str]]:
+
+def looks_like_dicom(filename: str, header: bytes) -> bool:
     """
-    Extract all files from a ZIP archive into a temporary directory.
-    Flattens nested directory structures during extraction.
+    Cheap check on a file's name and first DICOM_PREAMBLE_SIZE bytes to tell whether it may be a DICOM file.
+    Files are rejected only when they have neither the DICM marker nor a name DICOM files commonly use
+    (no extension, .dcm/.dicom, or a numeric suffix such as the last component of a UID), since DICOM
+    files without a preamble are still processed with force=True.
     
     Args:
-        zip_file_path: Path to the ZIP file to extract
+        filename: Base name of the file
+        header: First DICOM_PREAMBLE_SIZE bytes of the file
         
     Returns:
-        Tuple containing:
-            - temp_dir: Path to the temporary directory containing extracted files
-            - dicom_files: List of paths to extracted DICOM files
-            
-    Raises:
-        zipfile.BadZipFile: If the file is not a valid ZIP archive
-        Exception: For other extraction errors
+        True if the file should be processed as DICOM
     """
-    # Create a temporary directory for extraction
-    temp_dir = tempfile.mkdtemp(prefix='dicom_extract_')
-    dicom_files = []
-    
-    try:
-        logger.info(f"Extracting ZIP file: {zip_file_path}")
-        
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            # Get list of all files in the archive
-            file_list = zip_ref.namelist()
-            logger.info(f"Found {len(file_list)} items in ZIP archive")
-            
-            for file_info in zip_ref.infolist():
-                # Skip directories
-                if file_info.is_dir():
-                    continue
-                
-                # Skip hidden files and system files (like __MACOSX)
-                filename = os.path.basename(file_info.filename)
-                if filename.startswith('.') or '__MACOSX' in file_info.filename:
-                    logger.debug(f"Skipping system/hidden file: {file_info.filename}")
-                    continue
-                
-                # Extract file content
-                file_data = zip_ref.read(file_info.filename)
-                
-                # Create flattened filename (use only the basename)
-                # If there are duplicate filenames, append a counter
-                target_filename = filename
-                target_path = os.path.join(temp_dir, target_filename)
-                
-                # Handle duplicate filenames by appending a counter
-                counter = 1
-                while os.path.exists(target_path):
-                    name, ext = os.path.splitext(filename)
-                    target_filename = f"{name}_{counter}{ext}"
-                    target_path = os.path.join(temp_dir, target_filename)
-                    counter += 1
-                
-                # Write the file to the temporary directory
-                with open(target_path, 'wb') as f:
-                    f.write(file_data)
-                
-                dicom_files.append(target_path)
-                logger.debug(f"Extracted: {file_info.filename} -> {target_filename}")
-        
-        logger.info(f"Successfully extracted {len(dicom_files)} files to {temp_dir}")
-        return temp_dir, dicom_files
-        
-    except zipfile.BadZipFile as e:
-        logger.error(f"Invalid ZIP file: {zip_file_path}")
-        # Clean up temporary directory on error
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        raise
-    except Exception as e:
-        logger.error(f"Error extracting ZIP file: {str(e)}")
-        # Clean up temporary directory on error
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        raise
+    if header[128:DICOM_PREAMBLE_SIZE] == b'DICM':
+        return True
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in DICOM_EXTENSIONS or ext[1:].isdigit()
 
 
-def cleanup_temp_directory(temp_dir: str) -> None:
+@contextmanager
+def thread_local_zip_opener(zip_file_path: str):
     """
-    Clean up the temporary directory after processing.
+    Context manager yielding a function that returns a ZipFile over zip_file_path owned by the calling thread.
+    Each thread reads through its own buffered file handle, so members read concurrently do not keep
+    discarding one shared buffer. All handles are closed on exit.
     
     Args:
-        temp_dir: Path to the temporary directory to remove
+        zip_file_path: Path to the ZIP file
+        
+    Yields:
+        Callable returning the calling thread's ZipFile
     """
+    thread_state = threading.local()
+    handles = []
+    
+    def get_zip_file():
+        zip_ref = getattr(thread_state, 'zip_ref', None)
+        if zip_ref is None:
+            handle = open(zip_file_path, 'rb', buffering=EXTRACT_BUFFER_SIZE)
+            handles.append(handle)
+            zip_ref = thread_state.zip_ref = zipfile.ZipFile(handle)
+        return zip_ref
+    
     try:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-            logger.info(f"Cleaned up temporary directory: {temp_dir}")
-    except Exception as e:
-        logger.error(f"Error cleaning up temporary directory {temp_dir}: {str(e)}")
+        yield get_zip_file
+    finally:
+        for handle in handles:
+            handle.close()
 
 
-def extract_dicom_from_dicomfile_instance(dicom_file_instance):
+def list_dicom_members(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
     """
-    Extract DICOM files from a DICOMFile model instance.
-    This is a convenience function that works directly with Django model instances.
+    List the members of an open ZIP archive that should be processed as DICOM files.
+    Directories, hidden files and system files (like __MACOSX) are skipped.
     
     Args:
-        dicom_file_instance: Instance of DICOMFile model
+        zip_ref: Open ZipFile
         
     Returns:
-        Tuple containing:
-            - temp_dir: Path to the temporary directory containing extracted files
-            - dicom_files: List of paths to extracted DICOM files
+        List of ZipInfo entries in archive order
     """
-    # Get the file path from the FileField
-    zip_file_path = dicom_file_instance.file.path
-    
-    if not os.path.exists(zip_file_path):
-        raise FileNotFoundError(f"ZIP file not found: {zip_file_path}")
-    
-    return extract_dicom_from_zip(zip_file_path)
+    members = []
+    for file_info in zip_ref.infolist():
+        # Skip directories
+        if file_info.is_dir():
+            continue
+        
+        # Skip hidden files and system files (like __MACOSX)
+        filename = os.path.basename(file_info.filename)
+        if filename.startswith('.') or '__MACOSX' in file_info.filename:
+            logger.debug(f"Skipping system/hidden file: {file_info.filename}")
+            continue
+        
+        members.append(file_info)
+    return members
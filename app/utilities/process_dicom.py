@@ -1,20 +1,25 @@
 # This function will run as a celery task to extract metadata to extract from DICOM files and store it in the database.
 # This function will take as input the individual DICOM file, extract information from it and store it properly. 
 # It will use pydicom for the processing. Use force = True and check if the modality tag is present to process. If Modality tag is not present then skip the processing. 
-# It can handle either a single file path or a list of file paths provided by another function running before it. 
-# If multiple file paths are provided it will process each file sequentially
+# The processing task passes the files of an archive in batches (see process_dicom_batch), parsed ahead of time by a thread pool.
 # Information extracted will be stored in the Patient, DICOMStudy, DICOMSeries, DICOMInstance, ImageInformation, RTStructureSetInformation and RTStructureROI models. 
 # The Patient, DICOMStudy, DICOMSeries, DICOMInstance data will be saved for each file ensuring that if the data already existing it will be updated assuming something has changed. If the file has a dicom modality like CT / MR / PET then the ImageInformation is to be completed. If on the other hand it is a RTSTRUCT modality then we need to fill the data in the RTStructureSetInformation and RTStructureROI models. 
 # To ensure efficiency, database updates will be done in a single transaction after file metadata has been completely read. 
 # After the database transaction has been completed, we will need to store the dicom file using the Pydicom save_as function while ensuring that valid dicom files are generated. This will need to be stored in the application in a directory called processed_dicom_files.
 
+import contextlib
 import os
 import logging
 import re
-from typing import Union, List, Dict, Any
-from datetime import datetime
+import shutil
+import zipfile
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, IO, List
+from datetime import date, datetime
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import pydicom
 from django.db import transaction
 from django.conf import settings
@@ -24,6 +29,7 @@ from app.models import (
     ImageInformation, RTStructureSetInformation, RTStructureROI,
     GenderChoices
 )
+from app.utilities.extract_dicom_form_zip import looks_like_dicom, DICOM_PREAMBLE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -31,12 +37,53 @@ logger = logging.getLogger(__name__)
 IMAGE_MODALITIES = ['CT', 'MR', 'PT', 'PET']
 # Modalities that require RTStructureSet processing
 RTSTRUCT_MODALITY = 'RTSTRUCT'
+# Errors recorded for files that are skipped rather than failed
+MODALITY_MISSING_ERROR = "Modality tag not present"
+NOT_DICOM_ERROR = "Not a DICOM file"
+SKIPPED_FILE_ERRORS = frozenset({MODALITY_MISSING_ERROR, NOT_DICOM_ERROR})
+# Number of DICOM files whose database writes are committed together in one transaction
+INGEST_BATCH_SIZE = 100
+# Number of threads used to parse DICOM files ahead of the database writes
+DICOM_READ_WORKERS = min(os.cpu_count() or 1, 8)
+# Tags read from every DICOM file. Only these are parsed; pixel data and other elements are skipped
+DICOM_HEADER_TAGS = (
+    'PatientID', 'PatientName', 'PatientBirthDate', 'PatientSex',
+    'StudyInstanceUID', 'StudyDescription', 'StudyDate',
+    'SeriesInstanceUID', 'FrameOfReferenceUID', 'SeriesDescription', 'SeriesDate',
+    'SOPInstanceUID', 'Modality', 'PixelSpacing', 'SliceLocation', 'SliceThickness',
+    'PatientPosition', 'ImagePositionPatient', 'ImageOrientationPatient', 'InstanceNumber',
+)
+# Tags read from RTSTRUCT files instead of DICOM_HEADER_TAGS
+RTSTRUCT_TAGS = DICOM_HEADER_TAGS + (
+    'StructureSetROISequence', 'ROIContourSequence', 'ReferencedFrameOfReferenceSequence',
+)
+# Modality (0008,0060), probed before the rest of the header is read
+MODALITY_TAG = pydicom.tag.Tag('Modality')
+# File meta elements a file needs to be copied as is into processed_dicom_files
+REQUIRED_FILE_META = ('MediaStorageSOPClassUID', 'MediaStorageSOPInstanceUID', 'TransferSyntaxUID')
+# Buffer size used when copying original DICOM files into processed_dicom_files
+COPY_BUFFER_SIZE = 1024 * 1024
+# Characters replaced when building directory and file names for processed_dicom_files
+UNSAFE_PATH_CHARACTERS = re.compile(r'[^\w\.\-]')
+# str.translate table applying UNSAFE_PATH_CHARACTERS to ASCII strings, which most DICOM values are
+_ASCII_PATH_TRANSLATION = str.maketrans({
+    character: '_' for character in map(chr, range(128))
+    if not (character.isalnum() or character in '._-')
+})
+# Root directory of the processed DICOM file copies
+PROCESSED_DICOM_ROOT = os.path.join(settings.BASE_DIR, 'processed_dicom_files')
+
+# Directories under PROCESSED_DICOM_ROOT this process has already created, so the files of a
+# series do not repeat the makedirs calls
+_created_directories = set()
 
 
+@lru_cache(maxsize=8192)
 def sanitize_path_component(value, default='unknown'):
     """
     Sanitize a string to be safe for use as a directory or filename component.
     Removes or replaces characters that are unsafe for filesystems.
+    Results are cached, as the patient, study and series components repeat for every file of a series.
     
     Args:
         value: String to sanitize
@@ -53,7 +100,10 @@ def sanitize_path_component(value, default='unknown'):
     
     # Replace path separators and other unsafe characters
     # Keep only alphanumeric, dots, hyphens, and underscores
-    sanitized = re.sub(r'[^\w\.\-]', '_', sanitized)
+    if sanitized.isascii():
+        sanitized = sanitized.translate(_ASCII_PATH_TRANSLATION)
+    else:
+        sanitized = UNSAFE_PATH_CHARACTERS.sub('_', sanitized)
     
     # Remove leading/trailing dots and underscores
     sanitized = sanitized.strip('._')
@@ -87,6 +137,36 @@ def get_dicom_value(dataset, tag, default=None):
         return default
 
 
+def get_dicom_float_array(dataset, tag):
+    """
+    Read a multi-valued decimal string (DS) element as a float32 array.
+    The raw element text is split and converted by numpy in one pass, instead of pydicom creating
+    one DSfloat per value. Elements pydicom has already converted are used as they are.
+    
+    Args:
+        dataset: pydicom Dataset object
+        tag: DICOM tag name as string
+        
+    Returns:
+        numpy float32 array, empty if the tag is not present
+    """
+    element = dataset.get_item(tag)
+    if element is None:
+        return np.empty(0, dtype='<f4')
+    
+    value = element.value
+    if isinstance(value, bytes):
+        text = value.decode('ascii', errors='replace').strip(' \0')
+        if not text:
+            return np.empty(0, dtype='<f4')
+        try:
+            return np.array(text.split('\\')).astype('<f4')
+        except ValueError:
+            # Let pydicom decode values numpy cannot parse
+            value = get_dicom_value(dataset, tag, [])
+    return np.asarray(value if value is not None else [], dtype='<f4').ravel()
+
+
 def parse_dicom_date(date_string):
     """
     Parse DICOM date string (YYYYMMDD) to Python date object.
@@ -99,8 +179,12 @@ def parse_dicom_date(date_string):
     """
     if not date_string:
         return None
+    date_string = str(date_string)
     try:
-        return datetime.strptime(str(date_string), '%Y%m%d').date()
+        # Plain YYYYMMDD values are sliced directly; anything else goes through strptime
+        if len(date_string) == 8 and date_string.isascii() and date_string.isdigit():
+            return date(int(date_string[:4]), int(date_string[4:6]), int(date_string[6:]))
+        return datetime.strptime(date_string, '%Y%m%d').date()
     except Exception as e:
         logger.warning(f"Failed to parse date '{date_string}': {e}")
         return None
@@ -127,181 +211,280 @@ def map_patient_sex(dicom_sex):
     return sex_map.get(str(dicom_sex).upper())
 
 
-def process_patient_data(dataset):
+def update_or_create_if_changed(model, defaults, **lookup):
     """
-    Extract and save patient information from DICOM dataset.
+    Like update_or_create, but skips the UPDATE (and its row lock) when the existing row
+    already holds the given values, as it does for every file of a series after the first.
+    
+    Args:
+        model: Model class to write
+        defaults: Dictionary of field values to set
+        **lookup: Unique field values identifying the row
+        
+    Returns:
+        Tuple of (model instance, created)
+    """
+    existing = model.objects.filter(**lookup).first()
+    if existing is not None and all(
+        getattr(existing, model._meta.get_field(name).attname) == getattr(value, 'pk', value)
+        for name, value in defaults.items()
+    ):
+        return existing, False
+    return model.objects.update_or_create(defaults=defaults, **lookup)
+
+
+def get_patient_values(dataset):
+    """
+    Extract patient information from DICOM dataset.
     
     Args:
         dataset: pydicom Dataset object
         
     Returns:
-        Patient model instance
+        Dictionary of Patient field values, including unique_patient_id
     """
     patient_id = get_dicom_value(dataset, 'PatientID')
     if not patient_id:
         raise ValueError("PatientID is required but not found in DICOM file")
     
     patient_name = get_dicom_value(dataset, 'PatientName', '')
-    patient_dob = parse_dicom_date(get_dicom_value(dataset, 'PatientBirthDate'))
-    patient_sex = map_patient_sex(get_dicom_value(dataset, 'PatientSex'))
+    
+    return {
+        'unique_patient_id': patient_id,
+        'patient_name': str(patient_name),
+        'patient_dob': parse_dicom_date(get_dicom_value(dataset, 'PatientBirthDate')),
+        'patient_sex': map_patient_sex(get_dicom_value(dataset, 'PatientSex')),
+    }
+
+
+def process_patient_data(dataset):
+    """
+    Extract and save patient information from DICOM dataset.
+    
+    Args:
+        dataset: pydicom Dataset object
+        
+    Returns:
+        Patient model instance
+    """
+    patient_values = get_patient_values(dataset)
+    patient_id = patient_values.pop('unique_patient_id')
     
     # Update or create patient
-    patient, created = Patient.objects.update_or_create(
+    patient, created = update_or_create_if_changed(
+        Patient,
         unique_patient_id=patient_id,
-        defaults={
-            'patient_name': str(patient_name),
-            'patient_dob': patient_dob,
-            'patient_sex': patient_sex,
-        }
+        defaults=patient_values
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} patient: {patient_id}")
+    logger.debug(f"{'Created' if created else 'Updated'} patient: {patient_id}")
     return patient
 
 
-def process_study_data(dataset, patient):
+def get_study_values(dataset):
     """
-    Extract and save study information from DICOM dataset.
+    Extract study information from DICOM dataset.
     
     Args:
         dataset: pydicom Dataset object
-        patient: Patient model instance
         
     Returns:
-        DICOMStudy model instance
+        Dictionary of DICOMStudy field values, including study_instance_uid but not the patient
     """
     study_uid = get_dicom_value(dataset, 'StudyInstanceUID')
     if not study_uid:
         raise ValueError("StudyInstanceUID is required but not found in DICOM file")
     
-    study_description = get_dicom_value(dataset, 'StudyDescription', '')
-    study_date = parse_dicom_date(get_dicom_value(dataset, 'StudyDate'))
+    return {
+        'study_instance_uid': study_uid,
+        'study_description': get_dicom_value(dataset, 'StudyDescription', ''),
+        'study_date': parse_dicom_date(get_dicom_value(dataset, 'StudyDate')),
+    }
+
+
+def process_study_data(dataset, patient):
+    """
+    Extract and save study information from DICOM dataset.
+    
+    Args:
+        dataset: pydicom Dataset object
+        patient: Patient model instance
+        
+    Returns:
+        DICOMStudy model instance
+    """
+    study_values = get_study_values(dataset)
+    study_uid = study_values.pop('study_instance_uid')
     
     # Update or create study
-    study, created = DICOMStudy.objects.update_or_create(
+    study, created = update_or_create_if_changed(
+        DICOMStudy,
         study_instance_uid=study_uid,
-        defaults={
-            'patient': patient,
-            'study_description': study_description,
-            'study_date': study_date,
-        }
+        defaults={'patient': patient, **study_values}
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} study: {study_uid}")
+    logger.debug(f"{'Created' if created else 'Updated'} study: {study_uid}")
     return study
 
 
-def process_series_data(dataset, study):
+def get_series_values(dataset):
     """
-    Extract and save series information from DICOM dataset.
+    Extract series information from DICOM dataset.
     
     Args:
         dataset: pydicom Dataset object
-        study: DICOMStudy model instance
         
     Returns:
-        DICOMSeries model instance
+        Dictionary of DICOMSeries field values, including series_instance_uid but not the study
     """
     series_uid = get_dicom_value(dataset, 'SeriesInstanceUID')
     if not series_uid:
         raise ValueError("SeriesInstanceUID is required but not found in DICOM file")
     
-    frame_of_reference_uid = get_dicom_value(dataset, 'FrameOfReferenceUID', '')
-    series_description = get_dicom_value(dataset, 'SeriesDescription', '')
-    series_date = parse_dicom_date(get_dicom_value(dataset, 'SeriesDate'))
+    return {
+        'series_instance_uid': series_uid,
+        'frame_of_reference_uid': get_dicom_value(dataset, 'FrameOfReferenceUID', ''),
+        'series_description': get_dicom_value(dataset, 'SeriesDescription', ''),
+        'series_date': parse_dicom_date(get_dicom_value(dataset, 'SeriesDate')),
+    }
+
+
+def process_series_data(dataset, study):
+    """
+    Extract and save series information from DICOM dataset.
+    
+    Args:
+        dataset: pydicom Dataset object
+        study: DICOMStudy model instance
+        
+    Returns:
+        DICOMSeries model instance
+    """
+    series_values = get_series_values(dataset)
+    series_uid = series_values.pop('series_instance_uid')
     
     # Update or create series
-    series, created = DICOMSeries.objects.update_or_create(
+    series, created = update_or_create_if_changed(
+        DICOMSeries,
         series_instance_uid=series_uid,
-        defaults={
-            'dicom_study': study,
-            'frame_of_reference_uid': frame_of_reference_uid,
-            'series_description': series_description,
-            'series_date': series_date,
-        }
+        defaults={'dicom_study': study, **series_values}
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} series: {series_uid}")
+    logger.debug(f"{'Created' if created else 'Updated'} series: {series_uid}")
     return series
 
 
-def process_instance_data(dataset, series):
+def get_instance_values(dataset):
     """
-    Extract and save instance information from DICOM dataset.
+    Extract instance information from DICOM dataset.
     
     Args:
         dataset: pydicom Dataset object
-        series: DICOMSeries model instance
         
     Returns:
-        DICOMInstance model instance
+        Dictionary of DICOMInstance field values, including sop_instance_uid but not the series
     """
     sop_instance_uid = get_dicom_value(dataset, 'SOPInstanceUID')
     if not sop_instance_uid:
         raise ValueError("SOPInstanceUID is required but not found in DICOM file")
     
-    modality = get_dicom_value(dataset, 'Modality', '')
-    pixel_spacing = get_dicom_value(dataset, 'PixelSpacing', '')
+    pixel_spacing = get_dicom_value(dataset, 'PixelSpacing')
+    
+    return {
+        'sop_instance_uid': sop_instance_uid,
+        'modality': get_dicom_value(dataset, 'Modality', ''),
+        'pixel_spacing': [float(value) for value in pixel_spacing] if pixel_spacing else None,
+    }
+
+
+def process_instance_data(dataset, series):
+    """
+    Extract and save instance information from DICOM dataset.
+    
+    Args:
+        dataset: pydicom Dataset object
+        series: DICOMSeries model instance
+        
+    Returns:
+        DICOMInstance model instance
+    """
+    instance_values = get_instance_values(dataset)
+    sop_instance_uid = instance_values.pop('sop_instance_uid')
     
     # Update or create instance
     instance, created = DICOMInstance.objects.update_or_create(
         sop_instance_uid=sop_instance_uid,
-        defaults={
-            'dicom_series': series,
-            'modality': modality,
-            'pixel_spacing': str(pixel_spacing) if pixel_spacing else '',
-        }
+        defaults={'dicom_series': series, **instance_values}
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} instance: {sop_instance_uid}")
+    logger.debug(f"{'Created' if created else 'Updated'} instance: {sop_instance_uid}")
     return instance
 
 
-def process_image_information(dataset, instance):
+def get_image_information_values(dataset):
     """
-    Extract and save image-specific information for CT/MR/PET modalities.
+    Extract image-specific information for CT/MR/PET modalities.
     
     Args:
         dataset: pydicom Dataset object
-        instance: DICOMInstance model instance
+        
+    Returns:
+        Dictionary of ImageInformation field values, not including the instance
     """
     slice_location = get_dicom_value(dataset, 'SliceLocation')
     pixel_spacing = get_dicom_value(dataset, 'PixelSpacing')
     slice_thickness = get_dicom_value(dataset, 'SliceThickness')
-    patient_position = get_dicom_value(dataset, 'PatientPosition', '')
     image_position_patient = get_dicom_value(dataset, 'ImagePositionPatient')
     image_orientation_patient = get_dicom_value(dataset, 'ImageOrientationPatient')
-    instance_number = get_dicom_value(dataset, 'InstanceNumber')
     
-    # Convert to appropriate types for JSON storage
-    pixel_spacing_json = list(pixel_spacing) if pixel_spacing else None
-    image_position_json = list(image_position_patient) if image_position_patient else None
-    image_orientation_json = list(image_orientation_patient) if image_orientation_patient else None
+    return {
+        # Store measurements as plain floats rather than pydicom DS values
+        'slice_location': float(slice_location) if slice_location is not None else None,
+        'slice_thickness': float(slice_thickness) if slice_thickness is not None else None,
+        # Convert multi-valued tags to lists of floats for the array columns
+        'pixel_spacing': [float(value) for value in pixel_spacing] if pixel_spacing else None,
+        'image_position_patient': [float(value) for value in image_position_patient] if image_position_patient else None,
+        'image_orientation_patient': [float(value) for value in image_orientation_patient] if image_orientation_patient else None,
+        'patient_position': get_dicom_value(dataset, 'PatientPosition', ''),
+        'instance_number': get_dicom_value(dataset, 'InstanceNumber'),
+    }
+
+
+def process_image_information(dataset, instance, defer_save=False):
+    """
+    Extract and save image-specific information for CT/MR/PET modalities.
+    
+    Args:
+        dataset: pydicom Dataset object
+        instance: DICOMInstance model instance
+        defer_save: If True, return the unsaved ImageInformation instead of saving it, so the caller
+            can write a batch of them with ImageInformation.bulk_upsert
+        
+    Returns:
+        The unsaved ImageInformation instance when defer_save is True, otherwise None
+    """
+    image_info_values = get_image_information_values(dataset)
+    if defer_save:
+        return ImageInformation(dicom_instance=instance, **image_info_values)
     
     # Update or create image information
     image_info, created = ImageInformation.objects.update_or_create(
         dicom_instance=instance,
-        defaults={
-            'slice_location': slice_location,
-            'pixel_spacing': pixel_spacing_json,
-            'slice_thickness': slice_thickness,
-            'patient_position': patient_position,
-            'image_position_patient': image_position_json,
-            'image_orientation_patient': image_orientation_json,
-            'instance_number': instance_number,
-        }
+        defaults=image_info_values
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} image information for instance: {instance.sop_instance_uid}")
+    logger.debug(f"{'Created' if created else 'Updated'} image information for instance: {instance.sop_instance_uid}")
 
 
-def process_rtstruct_information(dataset, instance):
+def get_rtstruct_values(dataset):
     """
-    Extract and save RTStructureSet information.
+    Extract RTStructureSet information.
     
     Args:
         dataset: pydicom Dataset object
-        instance: DICOMInstance model instance
+        
+    Returns:
+        Dictionary of RTStructureSetInformation field values, not including the instance
     """
     # Get number of ROIs
     structure_set_roi_sequence = get_dicom_value(dataset, 'StructureSetROISequence', [])
@@ -317,29 +500,66 @@ def process_rtstruct_information(dataset, instance):
             ''
         )
     
+    return {
+        'number_of_roi': number_of_roi,
+        'referenced_frame_of_reference_uid': referenced_frame_of_reference_uid,
+        'prescription_template': None,  # Will be matched later by rules
+    }
+
+
+def process_rtstruct_information(dataset, instance):
+    """
+    Extract and save RTStructureSet information.
+    
+    Args:
+        dataset: pydicom Dataset object
+        instance: DICOMInstance model instance
+    """
     # Update or create RTStructureSet information
     rtstruct_info, created = RTStructureSetInformation.objects.update_or_create(
         dicom_instance=instance,
-        defaults={
-            'number_of_roi': number_of_roi,
-            'referenced_frame_of_reference_uid': referenced_frame_of_reference_uid,
-            'prescription_template_id': None,  # Will be matched later by rules
-        }
+        defaults=get_rtstruct_values(dataset)
     )
     
-    logger.info(f"{'Created' if created else 'Updated'} RTStructureSet information for instance: {instance.sop_instance_uid}")
+    logger.debug(f"{'Created' if created else 'Updated'} RTStructureSet information for instance: {instance.sop_instance_uid}")
     
     # Process individual ROIs
     process_rtstruct_rois(dataset, rtstruct_info)
 
 
-def process_rtstruct_rois(dataset, rtstruct_info):
+def pack_roi_contours(contours):
     """
-    Extract and save individual ROI information from RTStructureSet.
+    Pack ROI contours into a single float32 buffer.
+    
+    Args:
+        contours: List of (referenced SOP Instance UID, flat ContourData values as a float32 array) tuples
+        
+    Returns:
+        Tuple of (bytes of float32 x, y, z triplets, list of [uid, start, count] offsets)
+    """
+    offsets = []
+    start = 0
+    for referenced_sop_uid, contour_data in contours:
+        if len(contour_data) % 3:
+            raise ValueError(f"ContourData has {len(contour_data)} values, which is not a multiple of 3")
+        offsets.append([referenced_sop_uid, start, len(contour_data) // 3])
+        start += len(contour_data) // 3
+    
+    if not contours:
+        return b'', offsets
+    return np.concatenate([np.asarray(contour_data, dtype='<f4') for _, contour_data in contours]).tobytes(), offsets
+
+
+def get_roi_values(dataset):
+    """
+    Extract individual ROI information from RTStructureSet.
     
     Args:
         dataset: pydicom Dataset object
-        rtstruct_info: RTStructureSetInformation model instance
+        
+    Returns:
+        Dictionary mapping each ROI number to a dictionary of RTStructureROI field values. A repeated
+        ROI number keeps the last item, as sequential saves would.
     """
     structure_set_roi_sequence = get_dicom_value(dataset, 'StructureSetROISequence', [])
     roi_contour_sequence = get_dicom_value(dataset, 'ROIContourSequence', [])
@@ -352,57 +572,129 @@ def process_rtstruct_rois(dataset, rtstruct_info):
         
         contour_data_list = []
         for contour in contour_sequence:
-            contour_data = get_dicom_value(contour, 'ContourData', [])
+            contour_data = get_dicom_float_array(contour, 'ContourData')
             
-            # Get referenced SOP instance UID
-            contour_image_sequence = get_dicom_value(contour, 'ContourImageSequence', [])
+            # Get referenced SOP instance UID. Dataset.get is used directly here, as this loop
+            # runs once per contour and structure sets can hold tens of thousands of them
+            contour_image_sequence = contour.get('ContourImageSequence')
             referenced_sop_uid = ''
-            if contour_image_sequence and len(contour_image_sequence) > 0:
-                referenced_sop_uid = get_dicom_value(
-                    contour_image_sequence[0], 
-                    'ReferencedSOPInstanceUID', 
-                    ''
-                )
+            if contour_image_sequence:
+                referenced_sop_uid = contour_image_sequence[0].get('ReferencedSOPInstanceUID') or ''
             
-            if contour_data:
-                contour_data_list.append({
-                    'contour_data': list(contour_data),
-                    'referenced_sop_instance_uid': referenced_sop_uid
-                })
+            if len(contour_data):
+                contour_data_list.append((referenced_sop_uid, contour_data))
         
         roi_contour_map[roi_number] = contour_data_list
     
-    # Process each ROI
+    rois = {}
     for roi_item in structure_set_roi_sequence:
         roi_number = get_dicom_value(roi_item, 'ROINumber')
-        roi_name = get_dicom_value(roi_item, 'ROIName', '')
         
         # Get contour data for this ROI
-        roi_contour_data = roi_contour_map.get(roi_number, [])
-        
-        # Update or create ROI
-        roi, created = RTStructureROI.objects.update_or_create(
-            rt_structure_set=rtstruct_info,
-            roi_number=roi_number,
-            defaults={
-                'roi_name': roi_name,
-                'roi_contour_data': roi_contour_data,
-            }
-        )
+        roi_contour_points, roi_contour_offsets = pack_roi_contours(roi_contour_map.get(roi_number, []))
         
-        logger.debug(f"{'Created' if created else 'Updated'} ROI: {roi_name} (Number: {roi_number})")
+        rois[roi_number] = {
+            'roi_name': get_dicom_value(roi_item, 'ROIName', ''),
+            'roi_contour_points': roi_contour_points,
+            'roi_contour_offsets': roi_contour_offsets,
+        }
+    return rois
 
 
-def save_processed_dicom_file(dataset, original_file_path, sop_instance_uid):
+def process_rtstruct_rois(dataset, rtstruct_info):
+    """
+    Extract and save individual ROI information from RTStructureSet.
+    
+    Args:
+        dataset: pydicom Dataset object
+        rtstruct_info: RTStructureSetInformation model instance
+    """
+    # Build every ROI of the structure set and write them with one INSERT ... ON CONFLICT DO UPDATE
+    rois = [
+        RTStructureROI(rt_structure_set=rtstruct_info, roi_number=roi_number, **roi_values)
+        for roi_number, roi_values in get_roi_values(dataset).items()
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        for roi in rois:
+            logger.debug(f"Saving ROI: {roi.roi_name} (Number: {roi.roi_number})")
+    
+    if rois:
+        RTStructureROI.bulk_upsert(rois)
+
+
+def _ensure_directory(path):
+    """
+    Create a directory and its parents unless this process has already created it.
+    
+    Args:
+        path: Directory to create
+    """
+    if path not in _created_directories:
+        os.makedirs(path, exist_ok=True)
+        _created_directories.add(path)
+
+
+def _write_processed_copy(dataset, original_file_path, output_path, open_original):
+    """
+    Write the copy of an original DICOM file for save_processed_dicom_file.
+    
+    Args:
+        dataset: pydicom Dataset read from the original file
+        original_file_path: Original file path
+        output_path: Path of the copy
+        open_original: Optional callable returning the original file opened for binary reading
+    """
+    file_meta = getattr(dataset, 'file_meta', None)
+    in_file_format = getattr(dataset, 'preamble', None) is not None and file_meta is not None and all(
+        keyword in file_meta for keyword in REQUIRED_FILE_META
+    )
+    with open_original() if open_original is not None else open(original_file_path, 'rb') as source:
+        if in_file_format:
+            with open(output_path, 'wb') as destination:
+                shutil.copyfileobj(source, destination, length=COPY_BUFFER_SIZE)
+        else:
+            pydicom.dcmread(source, force=True).save_as(output_path, enforce_file_format=True)
+
+
+@lru_cache(maxsize=1024)
+def _processed_series_directory(patient_id, study_uid, series_uid):
+    """
+    Build the processed_dicom_files directory of a series from sanitized path components.
+    Cached so the path is built once per series rather than once per file.
+    
+    Args:
+        patient_id: Patient ID
+        study_uid: Study Instance UID
+        series_uid: Series Instance UID
+        
+    Returns:
+        Path of the series directory
+    """
+    return os.path.join(
+        PROCESSED_DICOM_ROOT,
+        sanitize_path_component(patient_id, 'unknown_patient'),
+        sanitize_path_component(study_uid, 'unknown_study'),
+        sanitize_path_component(series_uid, 'unknown_series'),
+    )
+
+
+def save_processed_dicom_file(dataset, original_file_path, sop_instance_uid, open_original=None):
     """
     Save the processed DICOM file to the processed_dicom_files directory.
     Files are organized by Patient ID, Study UID, and Series UID for better filesystem organization.
     All path components are sanitized to ensure filesystem safety.
     
+    The dataset only holds the tags read for processing, so the copy is made from the original file.
+    Files already in DICOM file format (preamble and file meta information) are copied byte for byte.
+    Other files are read in full and written with save_as, which adds the preamble and file meta
+    information, so the stored copy is always a valid DICOM file.
+    
     Args:
-        dataset: pydicom Dataset object
+        dataset: pydicom Dataset object, as returned by read_dicom_member
         original_file_path: Original file path
         sop_instance_uid: SOP Instance UID for naming
+        open_original: Optional callable returning the original file opened for binary reading, used
+            instead of opening original_file_path (e.g. to read an archive member)
         
     Returns:
         Path to saved file
@@ -412,29 +704,25 @@ def save_processed_dicom_file(dataset, original_file_path, sop_instance_uid):
     study_uid = get_dicom_value(dataset, 'StudyInstanceUID', 'unknown_study')
     series_uid = get_dicom_value(dataset, 'SeriesInstanceUID', 'unknown_series')
     
-    # Sanitize all path components to ensure filesystem safety
-    patient_id_safe = sanitize_path_component(patient_id, 'unknown_patient')
-    study_uid_safe = sanitize_path_component(study_uid, 'unknown_study')
-    series_uid_safe = sanitize_path_component(series_uid, 'unknown_series')
-    sop_instance_uid_safe = sanitize_path_component(sop_instance_uid, 'unknown_instance')
-    
     # Create organized directory structure: processed_dicom_files/patient_id/study_uid/series_uid/
-    processed_dir = os.path.join(
-        settings.BASE_DIR, 
-        'processed_dicom_files',
-        patient_id_safe,
-        study_uid_safe,
-        series_uid_safe
-    )
-    os.makedirs(processed_dir, exist_ok=True)
+    processed_dir = _processed_series_directory(patient_id, study_uid, series_uid)
+    _ensure_directory(processed_dir)
     
     # Generate filename using sanitized SOP Instance UID
-    filename = f"{sop_instance_uid_safe}.dcm"
-    output_path = os.path.join(processed_dir, filename)
+    sop_instance_uid_safe = sanitize_path_component(sop_instance_uid, 'unknown_instance')
+    output_path = f"{processed_dir}{os.sep}{sop_instance_uid_safe}.dcm"
     
     # Save the DICOM file
     try:
-        dataset.save_as(output_path, enforce_file_format=True)
+        try:
+            _write_processed_copy(dataset, original_file_path, output_path, open_original)
+        except FileNotFoundError:
+            # The directory was removed after this process created it; create it again and retry once
+            if os.path.isdir(processed_dir):
+                raise
+            _created_directories.discard(processed_dir)
+            _ensure_directory(processed_dir)
+            _write_processed_copy(dataset, original_file_path, output_path, open_original)
         logger.info(f"Saved processed DICOM file: {output_path}")
         return output_path
     except Exception as e:
@@ -442,12 +730,104 @@ def save_processed_dicom_file(dataset, original_file_path, sop_instance_uid):
         raise
 
 
-def process_single_dicom_file(file_path: str) -> Dict[str, Any]:
+def _past_modality_group(tag, vr, length):
+    """stop_when callback for pydicom that ends a read once group 0008 has been passed."""
+    return tag.group > MODALITY_TAG.group
+
+
+def _probe_modality(source):
+    """
+    Read only the Modality of a DICOM file, stopping once group 0008 has been read.
+    
+    Args:
+        source: Path or seekable binary file object of the DICOM file
+        
+    Returns:
+        The Modality value, or None if the file has no Modality
+    """
+    with contextlib.ExitStack() as stack:
+        if not hasattr(source, 'read'):
+            source = stack.enter_context(open(source, 'rb'))
+        dataset = pydicom.filereader.read_partial(
+            source, stop_when=_past_modality_group, force=True, specific_tags=[MODALITY_TAG]
+        )
+    return get_dicom_value(dataset, 'Modality')
+
+
+def _read_processing_tags(source) -> pydicom.Dataset:
+    """
+    Read the tags needed for processing from a DICOM file, stopping before the pixel data.
+    The Modality is probed first to choose the tags to read (RTSTRUCT_TAGS for RTSTRUCT files).
+    
+    Args:
+        source: Path or seekable binary file object of the DICOM file
+        
+    Returns:
+        The partially parsed pydicom Dataset
+    """
+    modality = _probe_modality(source)
+    if not modality:
+        # Files without a Modality are skipped, so the rest of the header is not parsed
+        return pydicom.Dataset()
+    
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    tags = RTSTRUCT_TAGS if modality == RTSTRUCT_MODALITY else DICOM_HEADER_TAGS
+    return pydicom.dcmread(source, force=True, specific_tags=tags, stop_before_pixels=True)
+
+
+def read_dicom_member(zip_ref: zipfile.ZipFile, file_info: zipfile.ZipInfo) -> pydicom.Dataset:
+    """
+    Read the tags needed for processing from a DICOM file straight from an open ZIP archive without
+    extracting it to disk. pydicom reads all element values while parsing, so the member can be closed afterwards.
+    
+    Args:
+        zip_ref: Open ZipFile containing the member
+        file_info: ZipInfo of the member to read
+        
+    Returns:
+        The parsed pydicom Dataset holding only DICOM_HEADER_TAGS (RTSTRUCT_TAGS for RTSTRUCT files),
+        or None if the member is not a DICOM file
+    """
+    with zip_ref.open(file_info) as member:
+        # Check the preamble first so obviously non-DICOM files are not decompressed and parsed
+        if not looks_like_dicom(os.path.basename(file_info.filename), member.read(DICOM_PREAMBLE_SIZE)):
+            return None
+        member.seek(0)
+        return _read_processing_tags(member)
+
+
+def flush_image_information(pending_image_information: Dict[int, ImageInformation]) -> None:
+    """
+    Write the image information collected by process_single_dicom_file in one batch and clear it.
+    Call this inside the transaction of the batch, so the rows commit with their instances.
+    
+    Args:
+        pending_image_information: Dictionary of unsaved ImageInformation keyed by DICOMInstance ID
+    """
+    if pending_image_information:
+        ImageInformation.bulk_upsert(pending_image_information.values(), batch_size=INGEST_BATCH_SIZE)
+        pending_image_information.clear()
+
+
+def process_single_dicom_file(
+    file_path: str,
+    dataset_future: Future,
+    pending_image_information: Dict[int, ImageInformation] = None,
+    open_original: Callable[[], IO[bytes]] = None
+) -> Dict[str, Any]:
     """
     Process a single DICOM file and extract metadata.
     
     Args:
-        file_path: Path to the DICOM file
+        file_path: Path to the DICOM file, or its name in the archive when open_original is given
+        dataset_future: Future of read_dicom_member for the file, submitted to a thread pool so the file
+            can be parsed ahead of time. Read errors are handled as usual.
+        pending_image_information: Optional dictionary collecting image information for a batch. When given,
+            image information is added to it keyed by DICOMInstance ID instead of being saved, and the caller
+            writes it with flush_image_information.
+        open_original: Optional callable returning the original file opened for binary reading, used
+            to copy it into processed_dicom_files when file_path cannot be opened (e.g. an archive member)
         
     Returns:
         Dictionary with processing results
@@ -463,18 +843,24 @@ def process_single_dicom_file(file_path: str) -> Dict[str, Any]:
     try:
         # Read DICOM file with force=True
         logger.info(f"Processing DICOM file: {file_path}")
-        dataset = pydicom.dcmread(file_path, force=True)
+        dataset = dataset_future.result()
+        
+        if dataset is None:
+            logger.info(f"Skipping file {file_path}: {NOT_DICOM_ERROR}")
+            result['error'] = NOT_DICOM_ERROR
+            return result
         
         # Check if Modality tag is present
         modality = get_dicom_value(dataset, 'Modality')
         if not modality:
-            logger.warning(f"Skipping file {file_path}: Modality tag not present")
-            result['error'] = "Modality tag not present"
+            logger.warning(f"Skipping file {file_path}: {MODALITY_MISSING_ERROR}")
+            result['error'] = MODALITY_MISSING_ERROR
             return result
         
         result['modality'] = modality
         
-        # Process within a transaction for efficiency
+        # Process within a transaction (a savepoint when called inside a batch transaction)
+        image_info = None
         with transaction.atomic():
             # Process patient, study, series, and instance data
             patient = process_patient_data(dataset)
@@ -486,14 +872,20 @@ def process_single_dicom_file(file_path: str) -> Dict[str, Any]:
             
             # Process modality-specific information
             if modality in IMAGE_MODALITIES:
-                process_image_information(dataset, instance)
+                image_info = process_image_information(
+                    dataset, instance, defer_save=pending_image_information is not None
+                )
             elif modality == RTSTRUCT_MODALITY:
                 process_rtstruct_information(dataset, instance)
             else:
                 logger.info(f"Modality {modality} does not require additional processing")
         
+        # Only queue the image information once the file's savepoint has been released
+        if image_info is not None:
+            pending_image_information[instance.pk] = image_info
+        
         # Save processed DICOM file after transaction completes
-        save_processed_dicom_file(dataset, file_path, instance.sop_instance_uid)
+        save_processed_dicom_file(dataset, file_path, instance.sop_instance_uid, open_original=open_original)
         
         result['success'] = True
         logger.info(f"Successfully processed DICOM file: {file_path}")
@@ -505,50 +897,209 @@ def process_single_dicom_file(file_path: str) -> Dict[str, Any]:
     return result
 
 
-def process_dicom_files(file_paths: Union[str, List[str]]) -> Dict[str, Any]:
+def _bulk_write_dicom_values(file_values: List[Dict[str, Any]]) -> None:
     """
-    Process DICOM files and extract metadata.
-    Can handle either a single file path or a list of file paths.
+    Write the values extracted from a batch of DICOM files with one bulk upsert per model.
+    Models are written parent first, and foreign keys are resolved from the primary keys returned
+    by the previous upsert. When several files share a UID the last file's values win, as with
+    sequential saves.
     
     Args:
-        file_paths: Single file path string or list of file paths
+        file_values: List of per-file dictionaries built by process_dicom_batch
+    """
+    patients = {}
+    studies = {}
+    series = {}
+    instances = {}
+    image_infos = {}
+    rtstructs = {}
+    rois = {}
+    for values in file_values:
+        patient_uid = values['patient']['unique_patient_id']
+        study_uid = values['study']['study_instance_uid']
+        series_uid = values['series']['series_instance_uid']
+        sop_instance_uid = values['instance']['sop_instance_uid']
         
-    Returns:
-        Dictionary with processing results for all files
+        patients[patient_uid] = values['patient']
+        studies[study_uid] = (patient_uid, values['study'])
+        series[series_uid] = (study_uid, values['series'])
+        instances[sop_instance_uid] = (series_uid, values['instance'])
+        if values['image_information'] is not None:
+            image_infos[sop_instance_uid] = values['image_information']
+        if values['rtstruct'] is not None:
+            rtstructs[sop_instance_uid] = values['rtstruct']
+            rois[sop_instance_uid] = values['rois']
+    
+    patient_ids = {
+        patient.unique_patient_id: patient.pk
+        for patient in Patient.bulk_upsert(patients.values())
+    }
+    study_ids = {
+        study.study_instance_uid: study.pk
+        for study in DICOMStudy.bulk_upsert(
+            {'patient_id': patient_ids[patient_uid], **study_values}
+            for patient_uid, study_values in studies.values()
+        )
+    }
+    series_ids = {
+        dicom_series.series_instance_uid: dicom_series.pk
+        for dicom_series in DICOMSeries.bulk_upsert(
+            {'dicom_study_id': study_ids[study_uid], **series_values}
+            for study_uid, series_values in series.values()
+        )
+    }
+    instance_ids = {
+        instance.sop_instance_uid: instance.pk
+        for instance in DICOMInstance.bulk_upsert(
+            {'dicom_series_id': series_ids[series_uid], **instance_values}
+            for series_uid, instance_values in instances.values()
+        )
+    }
+    if image_infos:
+        ImageInformation.bulk_upsert(
+            {'dicom_instance_id': instance_ids[sop_instance_uid], **image_info_values}
+            for sop_instance_uid, image_info_values in image_infos.items()
+        )
+    if rtstructs:
+        RTStructureSetInformation.bulk_upsert(
+            {'dicom_instance_id': instance_ids[sop_instance_uid], **rtstruct_values}
+            for sop_instance_uid, rtstruct_values in rtstructs.items()
+        )
+        RTStructureROI.bulk_upsert(
+            {'rt_structure_set_id': instance_ids[sop_instance_uid], 'roi_number': roi_number, **roi_values}
+            for sop_instance_uid, roi_values_by_number in rois.items()
+            for roi_number, roi_values in roi_values_by_number.items()
+        )
+    
+    logger.info(
+        f"Saved {len(instances)} instances in {len(series)} series, {len(studies)} studies "
+        f"and {len(patients)} patients"
+    )
+
+
+def _completed_future(value: Any) -> Future:
     """
-    # Ensure file_paths is a list
-    if isinstance(file_paths, str):
-        file_paths = [file_paths]
+    Wrap an already available value in a completed Future.
     
-    logger.info(f"Starting DICOM processing for {len(file_paths)} files")
+    Args:
+        value: Result of the Future
+        
+    Returns:
+        Future whose result is value
+    """
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def process_dicom_batch(
+    file_paths: List[str],
+    dataset_futures: List[Future],
+    original_openers: List[Callable[[], IO[bytes]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Process a batch of DICOM files, writing each model with one bulk upsert instead of saving file by file.
+    Call this inside transaction.atomic().
     
-    results = {
-        'total_files': len(file_paths),
-        'successful': 0,
-        'failed': 0,
-        'skipped': 0,
-        'file_results': []
-    }
+    All files are read and their values extracted first, so a file with missing or invalid tags fails on
+    its own. The rows of the remaining files are then written together (see _bulk_write_dicom_values).
+    If that write fails it is rolled back and the files are processed one at a time with
+    process_single_dicom_file, so only the offending files fail.
     
-    # Process each file sequentially
-    for idx, file_path in enumerate(file_paths, 1):
-        logger.info(f"Processing file {idx}/{len(file_paths)}: {file_path}")
+    Args:
+        file_paths: Paths of the DICOM files, or their names in the archive when original_openers is given
+        dataset_futures: List with one Future per file, of read_dicom_member, so the files can be parsed
+            ahead of time by a thread pool
+        original_openers: Optional list with one callable per file returning the original file opened for
+            binary reading, for files that cannot be opened by path (e.g. archive members)
+        
+    Returns:
+        List of per-file result dictionaries, in the order of file_paths
+    """
+    results = []
+    parsed_files = []
+    for index, file_path in enumerate(file_paths):
+        result = {
+            'file_path': file_path,
+            'success': False,
+            'error': None,
+            'sop_instance_uid': None,
+            'modality': None,
+        }
+        results.append(result)
         
-        file_result = process_single_dicom_file(file_path)
-        results['file_results'].append(file_result)
+        try:
+            # Read DICOM file with force=True
+            logger.info(f"Processing DICOM file: {file_path}")
+            dataset = dataset_futures[index].result()
+            
+            if dataset is None:
+                logger.info(f"Skipping file {file_path}: {NOT_DICOM_ERROR}")
+                result['error'] = NOT_DICOM_ERROR
+                continue
+            
+            # Check if Modality tag is present
+            modality = get_dicom_value(dataset, 'Modality')
+            if not modality:
+                logger.warning(f"Skipping file {file_path}: {MODALITY_MISSING_ERROR}")
+                result['error'] = MODALITY_MISSING_ERROR
+                continue
+            
+            result['modality'] = modality
+            
+            is_rtstruct = modality == RTSTRUCT_MODALITY
+            values = {
+                'patient': get_patient_values(dataset),
+                'study': get_study_values(dataset),
+                'series': get_series_values(dataset),
+                'instance': get_instance_values(dataset),
+                'image_information': get_image_information_values(dataset) if modality in IMAGE_MODALITIES else None,
+                'rtstruct': get_rtstruct_values(dataset) if is_rtstruct else None,
+                'rois': get_roi_values(dataset) if is_rtstruct else None,
+            }
+        except Exception as e:
+            logger.error(f"Error processing DICOM file {file_path}: {e}", exc_info=True)
+            result['error'] = str(e)
+            continue
         
-        if file_result['success']:
-            results['successful'] += 1
-        elif file_result['error'] == "Modality tag not present":
-            results['skipped'] += 1
-        else:
-            results['failed'] += 1
+        parsed_files.append((index, dataset, values))
     
-    logger.info(
-        f"DICOM processing completed. "
-        f"Successful: {results['successful']}, "
-        f"Failed: {results['failed']}, "
-        f"Skipped: {results['skipped']}"
-    )
+    if not parsed_files:
+        return results
+    
+    try:
+        with transaction.atomic():
+            _bulk_write_dicom_values([values for _, _, values in parsed_files])
+    except Exception as e:
+        logger.warning(f"Bulk write of {len(parsed_files)} DICOM files failed, processing them one at a time: {e}")
+        pending_image_information = {}
+        for index, dataset, _ in parsed_files:
+            results[index] = process_single_dicom_file(
+                file_paths[index],
+                dataset_future=_completed_future(dataset),
+                pending_image_information=pending_image_information,
+                open_original=original_openers[index] if original_openers is not None else None
+            )
+        flush_image_information(pending_image_information)
+        return results
+    
+    # Save processed DICOM files after the rows are written
+    for index, dataset, values in parsed_files:
+        result = results[index]
+        result['sop_instance_uid'] = values['instance']['sop_instance_uid']
+        try:
+            save_processed_dicom_file(
+                dataset,
+                result['file_path'],
+                result['sop_instance_uid'],
+                open_original=original_openers[index] if original_openers is not None else None
+            )
+        except Exception as e:
+            logger.error(f"Error processing DICOM file {result['file_path']}: {e}", exc_info=True)
+            result['error'] = str(e)
+            continue
+        
+        result['success'] = True
+        logger.info(f"Successfully processed DICOM file: {result['file_path']}")
     
     return results
@@ -1,10 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from celery.result import AsyncResult
+from celery import current_app, states
+from django_celery_results.backends import DatabaseBackend
+from django_celery_results.models import TaskResult
 import json
+import time
 
 from app.models import (
     DICOMFile, Patient, DICOMStudy, DICOMSeries, DICOMInstance,
@@ -13,7 +17,30 @@ from app.models import (
     CancerSideChoices, TreatmentModalityChoices, DoseUnitChoice
 )
 from django.core.exceptions import ValidationError
-from app.tasks import process_dicom_file_task
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from app.tasks import queue_dicom_file_task
+
+
+# Number of DICOM files listed per page on the landing and manage files pages
+DICOM_FILES_PER_PAGE = 50
+
+# Seconds between result backend reads in the task status event stream
+TASK_STATUS_STREAM_INTERVAL = 1
+# Seconds after which an open task status stream is closed for the client to reconnect
+TASK_STATUS_STREAM_TIMEOUT = 300
+# Status reported for task IDs the result backend has no record of
+UNKNOWN_TASK_STATE = 'UNKNOWN'
+
+# Choice lists passed to the rule group and prescription template forms, serialized once at import
+PARAMETER_CHOICES_JSON = json.dumps(list(ParameterToBeMatchedChoices.choices))
+OPERATOR_CHOICES_JSON = json.dumps(list(MatchingOperatorChoices.choices))
+COMBINATION_CHOICES_JSON = json.dumps(list(CombinationChoices.choices))
+CANCER_SIDE_CHOICES_JSON = json.dumps(list(CancerSideChoices.choices))
+TREATMENT_MODALITY_CHOICES_JSON = json.dumps(list(TreatmentModalityChoices.choices))
+DOSE_UNIT_CHOICES_JSON = json.dumps(list(DoseUnitChoice.choices))
 
 
 @staff_member_required
@@ -21,14 +48,24 @@ def dicom_index(request):
     """
     Frontend landing page showing DICOM files and processing status.
     """
-    dicom_files = DICOMFile.objects.all().order_by('-created_at')
+    # All status counts in one aggregate query
+    status_counts = DICOMFile.objects.aggregate(
+        pending_count=Count('id', filter=Q(processing_status='pending')),
+        processing_count=Count('id', filter=Q(processing_status='in_progress')),
+        completed_count=Count('id', filter=Q(processing_status='completed')),
+        failed_count=Count('id', filter=Q(processing_status='failed')),
+    )
+    
+    # Load only the columns the list renders, with the uploader joined in, one page at a time
+    dicom_files = DICOMFile.objects.select_related('uploaded_by').only(
+        'id', 'file', 'processing_status', 'processing_log_data', 'created_at', 'uploaded_by__username'
+    ).order_by('-created_at')
+    page_obj = Paginator(dicom_files, DICOM_FILES_PER_PAGE).get_page(request.GET.get('page'))
     
     context = {
-        'dicom_files': dicom_files,
-        'pending_count': dicom_files.filter(processing_status='pending').count(),
-        'processing_count': dicom_files.filter(processing_status='in_progress').count(),
-        'completed_count': dicom_files.filter(processing_status='completed').count(),
-        'failed_count': dicom_files.filter(processing_status='failed').count(),
+        'dicom_files': page_obj,
+        'page_obj': page_obj,
+        **status_counts,
     }
     
     return render(request, 'app/index.html', context)
@@ -54,8 +91,8 @@ def upload_dicom_file(request):
             
             # Check if user wants to process immediately
             if request.POST.get('process_now') == 'true':
-                task = process_dicom_file_task.delay(dicom_file.id)
-                return redirect(f"{reverse('dicom_processing_progress')}?task_ids={task.id}")
+                task_id = queue_dicom_file_task(dicom_file.id)
+                return redirect(f"{reverse('dicom_processing_progress')}?task_ids={task_id}")
             
             return redirect('dicom_index')
         else:
@@ -73,10 +110,24 @@ def process_dicom_file_view(request, dicom_file_id):
     dicom_file = get_object_or_404(DICOMFile, id=dicom_file_id)
     
     # Start the processing task
-    task = process_dicom_file_task.delay(dicom_file_id)
+    task_id = queue_dicom_file_task(dicom_file_id)
     
     # Redirect to progress page with task ID
-    return redirect(f"{reverse('dicom_processing_progress')}?task_ids={task.id}")
+    return redirect(f"{reverse('dicom_processing_progress')}?task_ids={task_id}")
+
+
+def _get_task_ids(request):
+    """
+    Read Celery task IDs from the comma-separated task_ids query parameter.
+
+    Args:
+        request: HTTP request
+
+    Returns:
+        list: Task IDs, in the order given
+    """
+    task_ids_str = request.GET.get('task_ids', '')
+    return [tid.strip() for tid in task_ids_str.split(',') if tid.strip()]
 
 
 @staff_member_required
@@ -84,8 +135,7 @@ def dicom_processing_progress(request):
     """
     View to display processing progress for one or more tasks.
     """
-    task_ids_str = request.GET.get('task_ids', '')
-    task_ids = [tid.strip() for tid in task_ids_str.split(',') if tid.strip()]
+    task_ids = _get_task_ids(request)
     
     if not task_ids:
         return render(request, 'app/processing_error.html', {
@@ -95,73 +145,214 @@ def dicom_processing_progress(request):
     context = {
         'task_ids': task_ids,
         'task_ids_json': json.dumps(task_ids),
+        'task_status_stream': settings.ICON_TASK_STATUS_STREAM,
     }
     
     return render(request, 'app/processing_progress.html', context)
 
 
-@staff_member_required
-def task_status(request, task_id):
+def _get_task_metas(task_ids):
     """
-    API endpoint to get the status of a Celery task.
-    Returns JSON with task state and progress information.
+    Read the result backend meta of several Celery tasks.
+    With the django-db result backend all tasks are read with one query, and IDs with no stored result
+    get the UNKNOWN_TASK_STATE status. Other backends are read task by task.
+
+    Args:
+        task_ids: List of Celery task IDs
+
+    Returns:
+        dict: Task meta (status and result) keyed by task ID
     """
-    result = AsyncResult(task_id)
+    backend = current_app.backend
+    if not isinstance(backend, DatabaseBackend):
+        return {task_id: backend.get_task_meta(task_id) for task_id in task_ids}
+    
+    # Queued tasks have a PENDING row (see record_pending_tasks), so IDs without a row were never issued
+    metas = {task_id: {'task_id': task_id, 'status': UNKNOWN_TASK_STATE, 'result': None} for task_id in task_ids}
+    task_results = TaskResult.objects.filter(task_id__in=task_ids).only('task_id', 'status', 'result', 'content_encoding')
+    for task_result in task_results:
+        metas[task_result.task_id] = backend.meta_from_decoded({
+            'task_id': task_result.task_id,
+            'status': task_result.status,
+            'result': backend.decode_content(task_result, task_result.result),
+        })
+    return metas
+
+
+def _task_status_data(task_id, meta):
+    """
+    Build the status payload for a Celery task.
+
+    Args:
+        task_id: Celery task ID
+        meta: Task meta from the result backend, as returned by _get_task_metas
+
+    Returns:
+        dict: Task state and progress information
+    """
+    state = meta['status']
+    info = meta.get('result')
     
     response_data = {
         'task_id': task_id,
-        'state': result.state,
-        'ready': result.ready(),
+        'state': state,
+        'ready': state in states.READY_STATES or state == UNKNOWN_TASK_STATE,
     }
     
-    if result.state == 'PENDING':
+    if state == 'PENDING':
         response_data.update({
             'current': 0,
             'total': 100,
             'percent': 0,
             'description': 'Waiting to start...'
         })
-    elif result.state == 'PROGRESS':
-        info = result.info
+    elif state == 'PROGRESS':
         response_data.update({
             'current': info.get('current', 0),
             'total': info.get('total', 100),
             'percent': info.get('percent', 0),
             'description': info.get('description', 'Processing...')
         })
-    elif result.state == 'SUCCESS':
+    elif state == 'SUCCESS':
         response_data.update({
             'current': 100,
             'total': 100,
             'percent': 100,
             'description': 'Completed!',
-            'result': result.result
+            'result': info
         })
-    elif result.state == 'FAILURE':
+    elif state == UNKNOWN_TASK_STATE:
         response_data.update({
             'current': 100,
             'total': 100,
             'percent': 100,
-            'description': f'Error: {str(result.info)}',
-            'error': str(result.info)
+            'description': 'Unknown task',
+            'error': 'Unknown task ID'
+        })
+    elif state == 'FAILURE':
+        response_data.update({
+            'current': 100,
+            'total': 100,
+            'percent': 100,
+            'description': f'Error: {str(info)}',
+            'error': str(info)
         })
     else:
         response_data.update({
-            'description': result.state
+            'description': state
         })
     
+    return response_data
+
+
+@staff_member_required
+def task_status(request, task_id):
+    """
+    API endpoint to get the status of a Celery task.
+    Returns JSON with task state and progress information.
+    """
+    response_data = _task_status_data(task_id, _get_task_metas([task_id])[task_id])
+    if response_data['state'] == UNKNOWN_TASK_STATE:
+        return JsonResponse(response_data, status=404)
     return JsonResponse(response_data)
 
 
+@staff_member_required
+def task_status_batch(request):
+    """
+    API endpoint to get the status of several Celery tasks in one request.
+    Task IDs are passed as a comma-separated task_ids query parameter.
+    Returns JSON mapping each task ID to its state and progress information.
+    """
+    task_ids = _get_task_ids(request)
+    
+    if not task_ids:
+        return JsonResponse({'error': 'No task IDs provided'}, status=400)
+    
+    metas = _get_task_metas(task_ids)
+    return JsonResponse({task_id: _task_status_data(task_id, metas[task_id]) for task_id in task_ids})
+
+
+def _task_status_events(task_ids):
+    """
+    Generate server-sent events for a set of Celery tasks.
+
+    Task states are read from the result backend in one batch per interval and an event
+    is only sent when a task's status changes. The stream ends once every task
+    is ready, or after TASK_STATUS_STREAM_TIMEOUT seconds so a worker is not held
+    indefinitely (the browser's EventSource reconnects on its own).
+
+    Args:
+        task_ids: List of Celery task IDs
+
+    Yields:
+        str: Server-sent event lines
+    """
+    # Tell the browser how long to wait before reconnecting a closed stream
+    yield f"retry: {int(TASK_STATUS_STREAM_INTERVAL * 1000)}\n\n"
+    
+    last_sent = {}
+    pending = list(task_ids)
+    deadline = time.monotonic() + TASK_STATUS_STREAM_TIMEOUT
+    while pending:
+        still_pending = []
+        metas = _get_task_metas(pending)
+        for task_id in pending:
+            status = _task_status_data(task_id, metas[task_id])
+            payload = json.dumps(status, cls=DjangoJSONEncoder)
+            if last_sent.get(task_id) != payload:
+                last_sent[task_id] = payload
+                yield f"data: {payload}\n\n"
+            if not status['ready']:
+                still_pending.append(task_id)
+        pending = still_pending
+        
+        if not pending:
+            yield "event: done\ndata: {}\n\n"
+            return
+        if time.monotonic() >= deadline:
+            return
+        # Comment line keeps proxies from closing an idle connection
+        yield ": keepalive\n\n"
+        time.sleep(TASK_STATUS_STREAM_INTERVAL)
+
+
+@staff_member_required
+def task_status_stream(request):
+    """
+    Server-sent events endpoint pushing status updates for one or more Celery tasks.
+    Task IDs are passed as a comma-separated task_ids query parameter.
+    Only available when ICON_TASK_STATUS_STREAM is enabled, as each stream holds a server worker.
+    """
+    if not settings.ICON_TASK_STATUS_STREAM:
+        raise Http404('Task status stream is disabled')
+    
+    task_ids = _get_task_ids(request)
+    
+    if not task_ids:
+        return JsonResponse({'error': 'No task IDs provided'}, status=400)
+    
+    response = StreamingHttpResponse(_task_status_events(task_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable response buffering in nginx so events are delivered as they are sent
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @staff_member_required
 def manage_files(request):
     """
     Frontend view to manage DICOM files.
     """
-    dicom_files = DICOMFile.objects.all().order_by('-created_at')
+    # Load only the columns the list renders, with the uploader joined in, one page at a time
+    dicom_files = DICOMFile.objects.select_related('uploaded_by').only(
+        'id', 'file', 'processing_status', 'created_at', 'updated_at', 'uploaded_by__username'
+    ).order_by('-created_at')
+    page_obj = Paginator(dicom_files, DICOM_FILES_PER_PAGE).get_page(request.GET.get('page'))
     
     context = {
-        'dicom_files': dicom_files,
+        'dicom_files': page_obj,
+        'page_obj': page_obj,
     }
     
     return render(request, 'app/manage_files.html', context)
@@ -229,19 +420,14 @@ def view_rulegroup_detail(request, rulegroup_id):
     Frontend view to display details of a specific rule group including its rulesets and rules.
     """
     rulegroup = get_object_or_404(RuleGroup, id=rulegroup_id)
-    rulesets = Ruleset.objects.filter(rulegroup=rulegroup).order_by('ruleset_order')
-    
-    rulesets_with_rules = []
-    for ruleset in rulesets:
-        rules = Rule.objects.filter(ruleset=ruleset).order_by('rule_order')
-        rulesets_with_rules.append({
-            'ruleset': ruleset,
-            'rules': rules
-        })
+    # Load the rules of every ruleset with one prefetch query
+    rulesets = Ruleset.objects.filter(rulegroup=rulegroup).order_by('ruleset_order').prefetch_related(
+        Prefetch('rule_set', queryset=Rule.objects.order_by('rule_order'), to_attr='rules')
+    )
     
     context = {
         'rulegroup': rulegroup,
-        'rulesets_with_rules': rulesets_with_rules,
+        'rulesets': list(rulesets),
     }
     
     return render(request, 'app/rulegroup_detail.html', context)
@@ -253,32 +439,25 @@ def view_patient_detail(request, patient_id):
     Frontend view to display detailed information about a patient including all studies, series, and instances.
     """
     patient = get_object_or_404(Patient, id=patient_id)
-    studies = DICOMStudy.objects.filter(patient=patient).order_by('-study_date')
     
-    studies_with_details = []
-    for study in studies:
-        series_list = DICOMSeries.objects.filter(dicom_study=study).order_by('series_instance_uid')
-        series_with_instances = []
-        
-        for series in series_list:
-            instances = DICOMInstance.objects.filter(dicom_series=series).order_by('sop_instance_uid')
-            series_with_instances.append({
-                'series': series,
-                'instances': instances,
-                'instance_count': instances.count()
-            })
-        
-        studies_with_details.append({
-            'study': study,
-            'series_list': series_with_instances,
-            'series_count': series_list.count(),
-            'total_instances': sum(item['instance_count'] for item in series_with_instances)
-        })
+    # Load the studies, their series and instances in one query per level, with the counts annotated
+    instances = DICOMInstance.objects.order_by('sop_instance_uid').only(
+        'dicom_series', 'sop_instance_uid', 'modality', 'pixel_spacing', 'created_at'
+    )
+    series = DICOMSeries.objects.order_by('series_instance_uid').annotate(
+        instance_count=Count('dicominstance')
+    ).prefetch_related(Prefetch('dicominstance_set', queryset=instances, to_attr='instances'))
+    studies = list(
+        DICOMStudy.objects.filter(patient=patient).order_by('-study_date').annotate(
+            series_count=Count('dicomseries', distinct=True),
+            total_instances=Count('dicomseries__dicominstance'),
+        ).prefetch_related(Prefetch('dicomseries_set', queryset=series, to_attr='series_list'))
+    )
     
     context = {
         'patient': patient,
-        'studies_with_details': studies_with_details,
-        'total_studies': studies.count(),
+        'studies': studies,
+        'total_studies': len(studies),
     }
     
     return render(request, 'app/patient_detail.html', context)
@@ -290,27 +469,92 @@ def view_study_detail(request, study_id):
     Frontend view to display detailed information about a study including all series and instances.
     """
     study = get_object_or_404(DICOMStudy, id=study_id)
-    series_list = DICOMSeries.objects.filter(dicom_study=study).order_by('series_instance_uid')
-    
-    series_with_instances = []
-    for series in series_list:
-        instances = DICOMInstance.objects.filter(dicom_series=series).order_by('sop_instance_uid')
-        series_with_instances.append({
-            'series': series,
-            'instances': instances,
-            'instance_count': instances.count()
-        })
+    
+    # Load the series and their instances with one query each, with the instance counts annotated
+    instances = DICOMInstance.objects.order_by('sop_instance_uid').only(
+        'dicom_series', 'sop_instance_uid', 'modality', 'pixel_spacing', 'created_at'
+    )
+    series_list = list(
+        DICOMSeries.objects.filter(dicom_study=study).order_by('series_instance_uid').annotate(
+            instance_count=Count('dicominstance')
+        ).prefetch_related(Prefetch('dicominstance_set', queryset=instances, to_attr='instances'))
+    )
     
     context = {
         'study': study,
-        'series_with_instances': series_with_instances,
-        'total_series': series_list.count(),
-        'total_instances': sum(item['instance_count'] for item in series_with_instances)
+        'series_list': series_list,
+        'total_series': len(series_list),
+        'total_instances': sum(series.instance_count for series in series_list)
     }
     
     return render(request, 'app/study_detail.html', context)
 
 
+def _create_rulesets(rulegroup, rulesets_data):
+    """
+    Create the rulesets of a rule group and their rules with one bulk insert per model.
+    
+    Args:
+        rulegroup: RuleGroup the rulesets belong to
+        rulesets_data: List of ruleset dictionaries, each with a list of rule dictionaries
+    """
+    rulesets = Ruleset.objects.bulk_create([
+        Ruleset(
+            rulegroup=rulegroup,
+            ruleset_order=ruleset_data['ruleset_order'],
+            ruleset_name=ruleset_data['ruleset_name'],
+            ruleset_combination=ruleset_data.get('ruleset_combination', '')
+        )
+        for ruleset_data in rulesets_data
+    ])
+    
+    Rule.objects.bulk_create([
+        Rule(
+            ruleset=ruleset,
+            rule_order=rule_data['rule_order'],
+            parameter_to_be_matched=rule_data.get('parameter_to_be_matched', ''),
+            matching_operator=rule_data.get('matching_operator', ''),
+            matching_value=rule_data.get('matching_value', ''),
+            rule_combination_type=rule_data.get('rule_combination_type', '')
+        )
+        for ruleset, ruleset_data in zip(rulesets, rulesets_data)
+        for rule_data in ruleset_data.get('rules', [])
+    ])
+
+
+def _create_prescriptions(template, prescriptions_data):
+    """
+    Validate the prescriptions of a template and create them with one bulk insert.
+    The template is expected to have no other prescriptions.
+    
+    Args:
+        template: Saved PrescriptionTemplate the prescriptions belong to
+        prescriptions_data: List of prescription dictionaries
+        
+    Raises:
+        ValidationError: If a prescription is invalid or an ROI name is repeated
+    """
+    prescriptions = []
+    roi_names = set()
+    for prescription_data in prescriptions_data:
+        prescription = Prescription(
+            prescription_template=template,
+            roi_name=prescription_data['roi_name'],
+            dose_prescribed=prescription_data['dose_prescribed'],
+            dose_unit=prescription_data.get('dose_unit', 'Gy'),
+            fractions_prescribed=prescription_data['fractions_prescribed']
+        )
+        # The unique ROI name constraint is checked against the other new prescriptions below,
+        # rather than with one query per prescription
+        prescription.full_clean(validate_constraints=False)
+        if prescription.roi_name in roi_names:
+            raise ValidationError({'roi_name': f'A prescription for ROI "{prescription.roi_name}" is already in this template.'})
+        roi_names.add(prescription.roi_name)
+        prescriptions.append(prescription)
+    
+    Prescription.objects.bulk_create(prescriptions)
+
+
 @staff_member_required
 def create_rulegroup(request):
     """
@@ -320,31 +564,15 @@ def create_rulegroup(request):
         try:
             data = json.loads(request.body)
             
-            # Create RuleGroup
-            rulegroup = RuleGroup.objects.create(
-                rulegroup_name=data['rulegroup_name'],
-                rulegroup_description=data.get('rulegroup_description', '')
-            )
-            
-            # Create Rulesets and Rules
-            for ruleset_data in data.get('rulesets', []):
-                ruleset = Ruleset.objects.create(
-                    rulegroup=rulegroup,
-                    ruleset_order=ruleset_data['ruleset_order'],
-                    ruleset_name=ruleset_data['ruleset_name'],
-                    ruleset_combination=ruleset_data.get('ruleset_combination', '')
+            with transaction.atomic():
+                # Create RuleGroup
+                rulegroup = RuleGroup.objects.create(
+                    rulegroup_name=data['rulegroup_name'],
+                    rulegroup_description=data.get('rulegroup_description', '')
                 )
                 
-                # Create Rules for this Ruleset
-                for rule_data in ruleset_data.get('rules', []):
-                    Rule.objects.create(
-                        ruleset=ruleset,
-                        rule_order=rule_data['rule_order'],
-                        parameter_to_be_matched=rule_data.get('parameter_to_be_matched', ''),
-                        matching_operator=rule_data.get('matching_operator', ''),
-                        matching_value=rule_data.get('matching_value', ''),
-                        rule_combination_type=rule_data.get('rule_combination_type', '')
-                    )
+                # Create Rulesets and Rules
+                _create_rulesets(rulegroup, data.get('rulesets', []))
             
             return JsonResponse({
                 'success': True,
@@ -360,9 +588,9 @@ def create_rulegroup(request):
     
     # GET request - show the form
     context = {
-        'parameter_choices': json.dumps(list(ParameterToBeMatchedChoices.choices)),
-        'operator_choices': json.dumps(list(MatchingOperatorChoices.choices)),
-        'combination_choices': json.dumps(list(CombinationChoices.choices)),
+        'parameter_choices': PARAMETER_CHOICES_JSON,
+        'operator_choices': OPERATOR_CHOICES_JSON,
+        'combination_choices': COMBINATION_CHOICES_JSON,
     }
     
     return render(request, 'app/create_rulegroup.html', context)
@@ -379,33 +607,20 @@ def edit_rulegroup(request, rulegroup_id):
         try:
             data = json.loads(request.body)
             
-            # Update RuleGroup
-            rulegroup.rulegroup_name = data['rulegroup_name']
-            rulegroup.rulegroup_description = data.get('rulegroup_description', '')
-            rulegroup.save()
-            
-            # Delete existing rulesets and rules (cascade will handle rules)
-            rulegroup.ruleset_set.all().delete()
-            
-            # Create new Rulesets and Rules
-            for ruleset_data in data.get('rulesets', []):
-                ruleset = Ruleset.objects.create(
-                    rulegroup=rulegroup,
-                    ruleset_order=ruleset_data['ruleset_order'],
-                    ruleset_name=ruleset_data['ruleset_name'],
-                    ruleset_combination=ruleset_data.get('ruleset_combination', '')
-                )
+            # Replace the rule group's rulesets and rules in one transaction, so it is never
+            # seen without them and a failed payload leaves it unchanged
+            with transaction.atomic():
+                # Update RuleGroup
+                rulegroup.rulegroup_name = data['rulegroup_name']
+                rulegroup.rulegroup_description = data.get('rulegroup_description', '')
+                rulegroup.save()
+                
+                # Delete existing rules, then rulesets, each with a single DELETE
+                Rule.objects.filter(ruleset__rulegroup=rulegroup).delete()
+                Ruleset.objects.filter(rulegroup=rulegroup).delete()
                 
-                # Create Rules for this Ruleset
-                for rule_data in ruleset_data.get('rules', []):
-                    Rule.objects.create(
-                        ruleset=ruleset,
-                        rule_order=rule_data['rule_order'],
-                        parameter_to_be_matched=rule_data.get('parameter_to_be_matched', ''),
-                        matching_operator=rule_data.get('matching_operator', ''),
-                        matching_value=rule_data.get('matching_value', ''),
-                        rule_combination_type=rule_data.get('rule_combination_type', '')
-                    )
+                # Create new Rulesets and Rules
+                _create_rulesets(rulegroup, data.get('rulesets', []))
             
             return JsonResponse({
                 'success': True,
@@ -446,9 +661,9 @@ def edit_rulegroup(request, rulegroup_id):
     context = {
         'rulegroup': rulegroup,
         'rulesets_data': json.dumps(rulesets_data),
-        'parameter_choices': json.dumps(list(ParameterToBeMatchedChoices.choices)),
-        'operator_choices': json.dumps(list(MatchingOperatorChoices.choices)),
-        'combination_choices': json.dumps(list(CombinationChoices.choices)),
+        'parameter_choices': PARAMETER_CHOICES_JSON,
+        'operator_choices': OPERATOR_CHOICES_JSON,
+        'combination_choices': COMBINATION_CHOICES_JSON,
         'is_edit': True,
     }
     
@@ -482,19 +697,12 @@ def create_prescription_template(request):
             
             # Validate the template
             template.full_clean()
-            template.save()
             
-            # Create Prescriptions
-            for prescription_data in data.get('prescriptions', []):
-                prescription = Prescription(
-                    prescription_template=template,
-                    roi_name=prescription_data['roi_name'],
-                    dose_prescribed=prescription_data['dose_prescribed'],
-                    dose_unit=prescription_data.get('dose_unit', 'Gy'),
-                    fractions_prescribed=prescription_data['fractions_prescribed']
-                )
-                prescription.full_clean()
-                prescription.save()
+            with transaction.atomic():
+                template.save()
+                
+                # Create Prescriptions
+                _create_prescriptions(template, data.get('prescriptions', []))
             
             return JsonResponse({
                 'success': True,
@@ -519,9 +727,9 @@ def create_prescription_template(request):
     
     context = {
         'rulegroups': rulegroups,
-        'cancer_side_choices': json.dumps(list(CancerSideChoices.choices)),
-        'treatment_modality_choices': json.dumps(list(TreatmentModalityChoices.choices)),
-        'dose_unit_choices': json.dumps(list(DoseUnitChoice.choices)),
+        'cancer_side_choices': CANCER_SIDE_CHOICES_JSON,
+        'treatment_modality_choices': TREATMENT_MODALITY_CHOICES_JSON,
+        'dose_unit_choices': DOSE_UNIT_CHOICES_JSON,
     }
     
     return render(request, 'app/create_prescription_template.html', context)
@@ -554,22 +762,15 @@ def edit_prescription_template(request, template_id):
             
             # Validate the template
             template.full_clean()
-            template.save()
-            
-            # Delete existing prescriptions
-            template.prescription_set.all().delete()
             
-            # Create new Prescriptions
-            for prescription_data in data.get('prescriptions', []):
-                prescription = Prescription(
-                    prescription_template=template,
-                    roi_name=prescription_data['roi_name'],
-                    dose_prescribed=prescription_data['dose_prescribed'],
-                    dose_unit=prescription_data.get('dose_unit', 'Gy'),
-                    fractions_prescribed=prescription_data['fractions_prescribed']
-                )
-                prescription.full_clean()
-                prescription.save()
+            with transaction.atomic():
+                template.save()
+                
+                # Delete existing prescriptions
+                template.prescription_set.all().delete()
+                
+                # Create new Prescriptions
+                _create_prescriptions(template, data.get('prescriptions', []))
             
             return JsonResponse({
                 'success': True,
@@ -606,9 +807,9 @@ def edit_prescription_template(request, template_id):
         'template': template,
         'rulegroups': rulegroups,
         'prescriptions_data': json.dumps(prescriptions_data),
-        'cancer_side_choices': json.dumps(list(CancerSideChoices.choices)),
-        'treatment_modality_choices': json.dumps(list(TreatmentModalityChoices.choices)),
-        'dose_unit_choices': json.dumps(list(DoseUnitChoice.choices)),
+        'cancer_side_choices': CANCER_SIDE_CHOICES_JSON,
+        'treatment_modality_choices': TREATMENT_MODALITY_CHOICES_JSON,
+        'dose_unit_choices': DOSE_UNIT_CHOICES_JSON,
         'is_edit': True,
     }
     
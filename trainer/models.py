@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from app.models import validate_zip_file, PrescriptionTemplate
+from app.models import validate_zip_file_full, PrescriptionTemplate
 
 # Create your models here.
 
@@ -12,7 +12,7 @@ class TrainingDataSetArchive(models.Model):
     '''
     Training data set will be uploaded by the users and will be used to train models. This model will hold information about the zip archive with the training dataset uploaded by the users.  
     '''
-    file = models.FileField(upload_to='training_data_set/',validators=[validate_zip_file],help_text="Upload the training data set here.")
+    file = models.FileField(upload_to='training_data_set/',validators=[validate_zip_file_full],help_text="Upload the training data set here.")
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE,help_text="User who uploaded the training data set.")
     archive_extracted = models.BooleanField(default=False)
     date_archive_extracted = models.DateTimeField(null=True, blank=True)